@@ -0,0 +1,182 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import metrics
+
+
+class AdmissionRejected(Exception):
+    """Raised when a lane's backlog is full or a request waited too long to start"""
+
+    def __init__(self, lane, reason, retry_after):
+        super().__init__(f'{lane} lane: {reason}')
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """One admitted document; release() gives its slot back, once"""
+
+    __slots__ = ('lane', 'size', 'waited', 'admitted_at', 'released')
+
+    def __init__(self, lane, size, waited):
+        self.lane = lane
+        self.size = size
+        self.waited = waited
+        self.admitted_at = time.monotonic()
+        self.released = False
+
+    def release(self):
+        self.lane._release(self)
+
+
+class Lane:
+    """Run at most max_documents pipelines, holding at most max_bytes of input between them
+
+    Up to max_queue more wait, and are admitted strictly in arrival order so
+    a large document at the head is never overtaken by smaller ones. A
+    document bigger than max_bytes on its own runs alone. Anything past the
+    backlog, or still queued after timeout seconds, is rejected.
+    """
+
+    def __init__(self, name, max_documents, max_bytes=None, max_queue=16, timeout=30.0):
+        self.name = name
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._waiting = deque()
+        self.running = 0
+        self.running_bytes = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.completed = 0
+        self.service_seconds = 0.0
+
+    def _fits(self, size):
+        if self.running >= self.max_documents:
+            return False
+        return self.max_bytes is None or self.running == 0 or self.running_bytes + size <= self.max_bytes
+
+    def retry_after(self):
+        """Seconds until the backlog has likely drained, from the mean time a document holds a slot"""
+        if not self.completed:
+            return 1
+        mean = self.service_seconds / self.completed
+        return max(1, math.ceil(mean * (len(self._waiting) + 1) / self.max_documents))
+
+    def acquire(self, size):
+        """Wait for room for a document of size bytes and return its Ticket"""
+        started = time.monotonic()
+        with self._cond:
+            if not self._waiting and self._fits(size):
+                return self._admit(size, 0.0)
+            if len(self._waiting) >= self.max_queue:
+                self.rejected += 1
+                metrics.registry.admission_rejected(self.name, 'backlog')
+                raise AdmissionRejected(self.name, 'too many documents are waiting', self.retry_after())
+            entry = [size]
+            self._waiting.append(entry)
+            self._publish()
+            deadline = started + self.timeout
+            try:
+                while self._waiting[0] is not entry or not self._fits(size):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        metrics.registry.admission_rejected(self.name, 'timeout')
+                        raise AdmissionRejected(self.name, 'waited too long to start', self.retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting.remove(entry)
+                # Whoever is now at the head may fit
+                self._cond.notify_all()
+                self._publish()
+            return self._admit(size, time.monotonic() - started)
+
+    def _admit(self, size, waited):
+        self.running += 1
+        self.running_bytes += size
+        self.admitted += 1
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self._publish()
+        metrics.registry.observe_admission(self.name, waited)
+        return Ticket(self, size, waited)
+
+    def _release(self, ticket):
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            self.running -= 1
+            self.running_bytes -= ticket.size
+            self.completed += 1
+            self.service_seconds += time.monotonic() - ticket.admitted_at
+            self._publish()
+            self._cond.notify_all()
+
+    def _publish(self):
+        metrics.registry.set_admission(self.name, self.running, len(self._waiting))
+
+    def stats(self):
+        with self._cond:
+            return {
+                'running': self.running,
+                'running_bytes': self.running_bytes,
+                'queued': len(self._waiting),
+                'queued_bytes': sum(entry[0] for entry in self._waiting),
+                'max_documents': self.max_documents,
+                'max_bytes': self.max_bytes,
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'mean_wait_s': round(self.wait_seconds / self.admitted, 4) if self.admitted else 0.0,
+                'max_wait_s': round(self.max_wait_seconds, 4),
+                'mean_service_s': round(self.service_seconds / self.completed, 4) if self.completed else 0.0
+            }
+
+
+class AdmissionController:
+    """Admit CPU-heavy processing through lanes chosen by document size
+
+    Documents up to fast_max_bytes use the fast lane, so a burst of large
+    uploads never holds small ones up; everything else shares the main lane.
+    A document whose text may be far larger than its bytes (a compressed
+    format) is admitted with fast=False and always uses the main lane.
+    """
+
+    def __init__(self, main, fast=None, fast_max_bytes=0):
+        self.main = main
+        self.fast = fast
+        self.fast_max_bytes = fast_max_bytes
+
+    def lane_for(self, size, fast=True):
+        if fast and self.fast is not None and size <= self.fast_max_bytes:
+            return self.fast
+        return self.main
+
+    def acquire(self, size, fast=True):
+        return self.lane_for(size, fast).acquire(size)
+
+    @contextmanager
+    def slot(self, size, fast=True):
+        """Hold a slot for a document of size bytes while the block runs"""
+        ticket = self.acquire(size, fast)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self):
+        lanes = [self.main] if self.fast is None else [self.main, self.fast]
+        return {lane.name: lane.stats() for lane in lanes}
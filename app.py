@@ -1,87 +1,124 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
-import nltk
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from werkzeug.security import generate_password_hash, check_password_hash
-from nltk.tokenize import sent_tokenize, word_tokenize
-from nltk.corpus import stopwords
-from collections import Counter
-import random
-import re
+import sys
+from flask import (Flask, Request, Response, current_app, g, has_request_context, render_template, request, jsonify,
+                   session, redirect, url_for)
 import sqlite3
 import json
+import random
 from datetime import datetime
 import traceback
+import tempfile
+import zipfile
+import base64
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from itsdangerous import BadData, URLSafeSerializer
+from result_cache import ResultCache, make_cache_key
+from jobs import JobManager
+from engine import (check_engine, download_nltk_data, fingerprint_text, iter_pipeline, iter_result_events,
+                    iter_text_chunks, paragraph_cache, run_pipeline, run_pipeline_windowed, warm_nltk)
+from passwords import HasherBusy, PasswordHasher
+from admission import AdmissionController, AdmissionRejected, Lane
+from near_duplicates import NearDuplicateIndex
+from cooccurrence import cooccurrence_index
+from extractors import (EXTRACTORS, ExtractionError, document_type, fingerprint_document, iter_document_text,
+                        pdf_extractor)
+import database
+import metrics
 
-def ensure_nltk_data():
-    """Ensure all required NLTK data is downloaded"""
-    required_data = [
-        ('tokenizers/punkt', 'punkt'),
-        ('tokenizers/punkt_tab', 'punkt_tab'),
-        ('corpora/stopwords', 'stopwords')
-    ]
-    for path, name in required_data:
-        try:
-            nltk.data.find(path)
-        except LookupError:
-            print(f"Downloading {name}...")
-            nltk.download(name, quiet=True)
+class SpooledUploadRequest(Request):
+    """Keep uploaded files in memory, spilling to a temp file only above UPLOAD_SPOOL_MAX_SIZE"""
 
-ensure_nltk_data()
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=current_app.config['UPLOAD_SPOOL_MAX_SIZE'], mode='rb+')
 
 app = Flask(__name__)
+app.request_class = SpooledUploadRequest
 app.secret_key = 'your-secret-key-change-this-12345'
-app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['DATABASE'] = 'study_helper.db'
+app.config['DB_POOL_SIZE'] = 8
+app.config['PAGE_SIZE'] = 20
+app.config['MAX_PAGE_SIZE'] = 100
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+app.config['UPLOAD_SPOOL_MAX_SIZE'] = 1024 * 1024
+app.config['UPLOAD_CHUNK_SIZE'] = 64 * 1024
+app.config['RESULT_CACHE_MAX_BYTES'] = 64 * 1024 * 1024
+app.config['PARAGRAPH_CACHE_MAX_BYTES'] = 64 * 1024 * 1024
+# Uploads whose word shingles overlap an analyzed document's by at least this
+# (estimated Jaccard similarity) reuse its cached result; None turns it off
+app.config['NEAR_DUPLICATE_THRESHOLD'] = 0.9
+app.config['SUMMARY_ENGINE'] = 'frequency'
+# Larger uploads are summarized in bounded memory, at about twice the CPU time
+app.config['WINDOWED_SUMMARY_MIN_CHARS'] = 4 * 1024 * 1024
+app.config['ASYNC_WORKERS'] = os.cpu_count()
+app.config['PDF_WORKERS'] = os.cpu_count()
+app.config['JOB_WAIT_MAX_SECONDS'] = 30
+app.config['BATCH_MAX_FILES'] = 500
+app.config['BATCH_MAX_UNCOMPRESSED'] = 256 * 1024 * 1024
+# Documents of one batch in the analyzer pool at once, each also admitted on its own
+app.config['BATCH_MAX_IN_FLIGHT'] = max(1, (os.cpu_count() or 2) // 2)
+# Text extracted from one document, and from all documents of a batch
+app.config['MAX_EXTRACTED_CHARS'] = 16 * 1024 * 1024
+app.config['BATCH_MAX_CHARS'] = 64 * 1024 * 1024
+app.config['COLD_START_BUDGET_S'] = 5.0
+app.config['METRICS_ENABLED'] = True
+app.config['SERVER_TIMING'] = False
+app.config['PASSWORD_HASH_METHOD'] = 'scrypt'
+app.config['PASSWORD_HASH_WORKERS'] = max(1, (os.cpu_count() or 2) // 2)
+app.config['PASSWORD_HASH_QUEUE'] = 32
+app.config['PASSWORD_RETRY_AFTER_S'] = 1
+# Uploads that need the pipeline are admitted by size: at most this many
+# documents and bytes in progress, then a bounded queue, then 503
+app.config['ADMISSION_MAX_DOCUMENTS'] = os.cpu_count()
+app.config['ADMISSION_MAX_BYTES'] = 64 * 1024 * 1024
+app.config['ADMISSION_MAX_QUEUE'] = 16
+app.config['ADMISSION_QUEUE_TIMEOUT_S'] = 30
+app.config['FAST_LANE_MAX_BYTES'] = 256 * 1024
+app.config['FAST_LANE_MAX_DOCUMENTS'] = 2
+app.config['FAST_LANE_MAX_QUEUE'] = 32
 
-# Create necessary folders
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs('templates', exist_ok=True)
-os.makedirs('static', exist_ok=True)
+db = database.Database(app.config['DATABASE'], pool_size=app.config['DB_POOL_SIZE'])
 
 def init_db():
-    """Initialize database with required tables"""
+    """Initialize database by applying schema migrations"""
     try:
-        conn = sqlite3.connect('study_helper.db')
-        c = conn.cursor()
-        
-        # Users table
-        c.execute('''CREATE TABLE IF NOT EXISTS users
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      username TEXT UNIQUE NOT NULL,
-                      email TEXT UNIQUE NOT NULL,
-                      password TEXT NOT NULL,
-                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        
-        # Summaries table
-        c.execute('''CREATE TABLE IF NOT EXISTS summaries
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      user_id INTEGER NOT NULL,
-                      title TEXT NOT NULL,
-                      summary TEXT NOT NULL,
-                      keywords TEXT NOT NULL,
-                      original_length INTEGER,
-                      summary_length INTEGER,
-                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                      FOREIGN KEY (user_id) REFERENCES users(id))''')
-        
-        # Quiz results table
-        c.execute('''CREATE TABLE IF NOT EXISTS quiz_results
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      user_id INTEGER NOT NULL,
-                      summary_id INTEGER,
-                      score INTEGER NOT NULL,
-                      total_questions INTEGER NOT NULL,
-                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                      FOREIGN KEY (user_id) REFERENCES users(id),
-                      FOREIGN KEY (summary_id) REFERENCES summaries(id))''')
-        
-        conn.commit()
-        conn.close()
-        print("✓ Database initialized successfully!")
+        version = db.migrate()
+        print(f"✓ Database initialized successfully! (schema v{version})")
     except Exception as e:
         print(f"✗ Database initialization error: {e}")
 
-init_db()
+def observe_db(seconds):
+    """Record how long a database connection was held, labelled with the route"""
+    route = (request.endpoint or 'unmatched') if has_request_context() else 'background'
+    metrics.registry.observe_db(route, seconds)
+
+# Wired at import, so the app collects metrics however it is started
+metrics.registry.enabled = app.config['METRICS_ENABLED']
+db.observer = observe_db if metrics.registry.enabled else None
+result_cache = ResultCache(db, max_bytes=app.config['RESULT_CACHE_MAX_BYTES'])
+near_duplicate_index = NearDuplicateIndex(db, threshold=app.config['NEAR_DUPLICATE_THRESHOLD'])
+cooccurrence_index.db = db
+paragraph_cache.max_bytes = app.config['PARAGRAPH_CACHE_MAX_BYTES']
+pdf_extractor.max_workers = app.config['PDF_WORKERS']
+password_hasher = PasswordHasher(app.config['PASSWORD_HASH_METHOD'], max_workers=app.config['PASSWORD_HASH_WORKERS'],
+                                 max_queue=app.config['PASSWORD_HASH_QUEUE'])
+
+admission = AdmissionController(
+    Lane('main', app.config['ADMISSION_MAX_DOCUMENTS'], max_bytes=app.config['ADMISSION_MAX_BYTES'],
+         max_queue=app.config['ADMISSION_MAX_QUEUE'], timeout=app.config['ADMISSION_QUEUE_TIMEOUT_S']),
+    fast=Lane('fast', app.config['FAST_LANE_MAX_DOCUMENTS'], max_queue=app.config['FAST_LANE_MAX_QUEUE'],
+              timeout=app.config['ADMISSION_QUEUE_TIMEOUT_S']),
+    fast_max_bytes=app.config['FAST_LANE_MAX_BYTES'])
+
+def busy_response(retry_after):
+    """503 telling the client how many seconds to wait before retrying"""
+    response = jsonify({'error': 'Server is busy, please try again in a moment'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
 
 @app.errorhandler(500)
 def internal_error(error):
@@ -121,19 +158,24 @@ def login():
         if not username or not password:
             return jsonify({'error': 'Username and password are required'}), 400
         
-        conn = sqlite3.connect('study_helper.db')
-        c = conn.cursor()
-        c.execute('SELECT id, username, password FROM users WHERE username = ?', (username,))
-        user = c.fetchone()
-        conn.close()
+        with db.connection() as conn:
+            user = database.find_user(conn, username)
         
-        if user and check_password_hash(user[2], password):
-            session['user_id'] = user[0]
-            session['username'] = user[1]
-            return jsonify({'success': True, 'message': 'Login successful!'})
+        if user:
+            matches, new_hash = password_hasher.verify(user[2], password)
+            if matches:
+                if new_hash:
+                    # Stored with older parameters; upgrade while we have the plain password
+                    with db.connection() as conn:
+                        database.update_password(conn, user[0], new_hash)
+                session['user_id'] = user[0]
+                session['username'] = user[1]
+                return jsonify({'success': True, 'message': 'Login successful!'})
         
         return jsonify({'error': 'Invalid username or password'}), 401
     
+    except HasherBusy:
+        return busy_response(app.config['PASSWORD_RETRY_AFTER_S'])
     except Exception as e:
         print(f"Login error: {e}")
         print(traceback.format_exc())
@@ -158,18 +200,16 @@ def register():
         if not email or '@' not in email:
             return jsonify({'error': 'Valid email is required'}), 400
         
-        hashed_password = generate_password_hash(password)
+        hashed_password = password_hasher.hash(password)
         
-        conn = sqlite3.connect('study_helper.db')
-        c = conn.cursor()
-        c.execute('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
-                  (username, email, hashed_password))
-        conn.commit()
-        conn.close()
+        with db.connection() as conn:
+            database.create_user(conn, username, email, hashed_password)
         return jsonify({'success': True, 'message': 'Registration successful! Please login.'})
     
     except sqlite3.IntegrityError:
         return jsonify({'error': 'Username or email already exists'}), 400
+    except HasherBusy:
+        return busy_response(app.config['PASSWORD_RETRY_AFTER_S'])
     except Exception as e:
         print(f"Registration error: {e}")
         print(traceback.format_exc())
@@ -195,87 +235,165 @@ def dashboard():
         print(traceback.format_exc())
         return f"Dashboard error: {str(e)}", 500
 
-def extract_text_from_file(file_path):
-    """Extract text from file"""
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        return f.read()
+def summary_engine_arg():
+    """Read and validate the summary_engine form field"""
+    engine = request.form.get('summary_engine', app.config['SUMMARY_ENGINE'])
+    check_engine(engine)
+    return engine
 
-def summarize_text(text, num_sentences=5):
-    """Summarize text"""
-    sentences = sent_tokenize(text)
-    if len(sentences) <= num_sentences:
-        return text
-    
-    stop_words = set(stopwords.words('english'))
-    words = word_tokenize(text.lower())
-    words = [word for word in words if word.isalnum() and word not in stop_words]
-    word_freq = Counter(words)
-    
-    sentence_scores = {}
-    for sentence in sentences:
-        sentence_words = word_tokenize(sentence.lower())
-        score = sum(word_freq.get(word, 0) for word in sentence_words if word.isalnum())
-        sentence_scores[sentence] = score
-    
-    top_sentences = sorted(sentence_scores, key=sentence_scores.get, reverse=True)[:num_sentences]
-    
-    summary = []
-    for sentence in sentences:
-        if sentence in top_sentences:
-            summary.append(sentence)
-    
-    return ' '.join(summary)
-
-def extract_keywords(text, num_keywords=10):
-    """Extract keywords from text"""
-    stop_words = set(stopwords.words('english'))
-    words = word_tokenize(text.lower())
-    words = [word for word in words if word.isalnum() and word not in stop_words and len(word) > 3]
-    word_freq = Counter(words)
-    return [word for word, freq in word_freq.most_common(num_keywords)]
-
-def generate_quiz(text, num_questions=5):
-    """Generate MCQ quiz from text"""
-    sentences = sent_tokenize(text)
-    keywords = extract_keywords(text, num_keywords=20)
-    
-    quiz = []
-    used_sentences = set()
-    
-    for i in range(min(num_questions, len(sentences))):
-        suitable_sentences = [s for s in sentences 
-                            if s not in used_sentences 
-                            and any(kw in s.lower() for kw in keywords)]
-        
-        if not suitable_sentences:
-            break
-        
-        sentence = random.choice(suitable_sentences)
-        used_sentences.add(sentence)
-        
-        sentence_words = word_tokenize(sentence.lower())
-        important_words = [w for w in sentence_words if w in keywords and len(w) > 4]
-        
-        if not important_words:
-            continue
-        
-        correct_answer = random.choice(important_words)
-        question_text = re.sub(r'\b' + correct_answer + r'\b', '__', sentence, flags=re.IGNORECASE)
-        
-        wrong_options = [w for w in keywords if w != correct_answer]
-        random.shuffle(wrong_options)
-        wrong_options = list(set(wrong_options))[:3]
-        
-        all_options = wrong_options + [correct_answer]
-        random.shuffle(all_options)
-        
-        quiz.append({
-            'question': question_text,
-            'options': all_options,
-            'correct_answer': correct_answer
-        })
-    
-    return quiz
+def pipeline_size_args():
+    """(num_sentences, num_questions) from the summary_length and quiz_questions form fields, at least 0
+
+    Raises ValueError unless both are integers.
+    """
+    try:
+        num_sentences = int(request.form.get('summary_length', 5))
+        num_questions = int(request.form.get('quiz_questions', 5))
+    except ValueError:
+        raise ValueError('summary_length and quiz_questions must be integers')
+    # A negative count would slice questions off the end of the pool instead
+    return max(num_sentences, 0), max(num_questions, 0)
+
+STREAM_MIMETYPES = {'ndjson': 'application/x-ndjson', 'sse': 'text/event-stream'}
+
+def stream_format_arg():
+    """Streaming format from the stream form field or the Accept header; None for one JSON body"""
+    stream_format = request.form.get('stream')
+    if stream_format:
+        if stream_format not in STREAM_MIMETYPES:
+            raise ValueError(f"Unknown stream format '{stream_format}'")
+        return stream_format
+    best = request.accept_mimetypes.best_match(['application/json', *STREAM_MIMETYPES.values()])
+    for name, mimetype in STREAM_MIMETYPES.items():
+        if best == mimetype:
+            return name
+    return None
+
+def format_event(stream_format, event, payload):
+    """One streamed event as an SSE message or an NDJSON line"""
+    if stream_format == 'sse':
+        return f'event: {event}\ndata: {json.dumps(payload)}\n\n'
+    return json.dumps({'event': event, 'data': payload}) + '\n'
+
+job_manager = JobManager(db, max_workers=app.config['ASYNC_WORKERS'], initializer=warm_nltk)
+
+def insert_summary(conn, user_id, title, result):
+    """Insert a summaries row with an open connection and return its id"""
+    with metrics.stage('db_insert'):
+        summary_id = database.insert_summary(conn, user_id, title, result['summary'], json.dumps(result['keywords']),
+                                             result['original_length'], result['summary_length'])
+        # Results cached before quiz pools existed have none
+        if result.get('quiz_pool'):
+            database.insert_quiz_pool(conn, summary_id, result['quiz_pool'])
+        return summary_id
+
+# Signs the quiz_token that ties a graded attempt to the quiz it was issued
+quiz_signer = URLSafeSerializer(app.secret_key, salt='quiz')
+
+def quiz_token(summary_id, num_questions, seed=None):
+    """Token naming an issued quiz, which /save-quiz-result grades answers against"""
+    return quiz_signer.dumps([summary_id, num_questions, seed])
+
+def quiz_positions(pool_size, num_questions, rng=None):
+    """Pool positions of an issued quiz: sampled with rng, or the first num_questions as /process returns them"""
+    count = min(num_questions, pool_size)
+    return rng.sample(range(pool_size), count) if rng is not None else list(range(count))
+
+def public_question(question):
+    """A pooled question without its answer"""
+    return {key: value for key, value in question.items() if key != 'correct_answer'}
+
+def public_result(result):
+    """A result as sent to clients
+
+    The question pool stays on the server. Quizzes drawn from a pool are
+    graded there, so their answers are left out; results cached before
+    pools existed keep them.
+    """
+    public = {key: value for key, value in result.items() if key != 'quiz_pool'}
+    if result.get('quiz_pool'):
+        public['quiz'] = [public_question(question) for question in result['quiz']]
+    return public
+
+def saved_result(summary_id, result):
+    """Response body for a saved result, with the quiz_token for its quiz"""
+    body = {'summary_id': summary_id, **public_result(result)}
+    if result.get('quiz_pool'):
+        body['quiz_token'] = quiz_token(summary_id, len(result['quiz']))
+    return body
+
+def save_summary(user_id, title, result):
+    """Insert the summaries row for a processed document and return its id"""
+    with db.connection() as conn:
+        return insert_summary(conn, user_id, title, result)
+
+def remember_result(cache_key, digest, user_id, signature, result):
+    """Cache a freshly computed result and index its document for the user's near-duplicate lookups"""
+    result_cache.put(cache_key, result)
+    near_duplicate_index.add(digest, user_id, signature)
+
+def reuse_near_duplicate(user_id, signature, num_sentences, num_questions, engine):
+    """The cached result of a nearly identical document the user processed with the same parameters, or None
+
+    Only the user's own documents are matched: the part of a near copy
+    that differs may be exactly what its owner wants kept private. For the
+    same reason the result is not cached under the new upload's digest,
+    which any user uploading that text would hit.
+    """
+    return near_duplicate_index.reuse(signature, user_id, lambda digest: result_cache.get(
+        make_cache_key(digest, num_sentences, num_questions, engine)))
+
+def stream_process_events(events, stream_format, user_id, title, remember=None, graded=True):
+    """Stream pipeline events as they are ready, then save the result and send 'done'
+
+    remember is called with a freshly computed result; it is None when the
+    result came from the cache. graded is whether the quiz comes from a
+    stored pool, so its answers are held back.
+    """
+    try:
+        for event, payload in events:
+            if event != 'result':
+                if event == 'question' and graded:
+                    payload = public_question(payload)
+                yield format_event(stream_format, event, payload)
+                continue
+            if remember is not None:
+                remember(payload)
+            body = saved_result(save_summary(user_id, title, payload), payload)
+            done = {'success': True, 'summary_id': body['summary_id']}
+            if 'quiz_token' in body:
+                done['quiz_token'] = body['quiz_token']
+            yield format_event(stream_format, 'done', done)
+    except Exception as e:
+        print(f"Process stream error: {e}")
+        print(traceback.format_exc())
+        yield format_event(stream_format, 'error', {'error': f'An error occurred: {str(e)}'})
+
+def document_chunks(stream, kind, chunk_size):
+    """Text chunks of an upload, refused with ExtractionError past MAX_EXTRACTED_CHARS"""
+    return iter_document_text(stream, kind, chunk_size, max_chars=app.config['MAX_EXTRACTED_CHARS'])
+
+def reread(stream, kind, chunk_size):
+    """Text chunks of an upload from the start, for pipelines that read it more than once"""
+    stream.seek(0)
+    return document_chunks(stream, kind, chunk_size)
+
+def fast_lane_allowed(kind):
+    """Whether an upload may be admitted by its size: only formats whose text is no larger than their bytes"""
+    return kind in ('txt', 'html')
+
+def text_too_short():
+    return jsonify({'error': 'Text is too short. Please upload a larger file (minimum 100 characters)'}), 400
+
+def job_response(job):
+    """JSON view of a job"""
+    body = {'job_id': job['id'], 'status': job['status'], 'title': job['title'],
+            'created_at': job['created_at'], 'finished_at': job['finished_at']}
+    if job['status'] == 'done':
+        body.update(success=True, **job['result'])
+    elif job['status'] == 'failed':
+        body['error'] = job['error']
+    return body
 
 @app.route('/process', methods=['POST'])
 def process_file():
@@ -283,112 +401,607 @@ def process_file():
     if 'user_id' not in session:
         return jsonify({'error': 'Please login first', 'redirect': '/login'}), 401
     
-    file_path = None
     try:
-        if 'file' not in request.files:
+        # The multipart body is parsed and spooled on first access
+        with metrics.stage('save'):
+            files = request.files
+        if 'file' not in files:
             return jsonify({'error': 'No file uploaded'}), 400
         
-        file = request.files['file']
+        file = files['file']
         if file.filename == '':
             return jsonify({'error': 'Please select a file'}), 400
         
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-        file.save(file_path)
+        try:
+            num_sentences, num_questions = pipeline_size_args()
+            engine = summary_engine_arg()
+            stream_format = stream_format_arg()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        run_async = request.form.get('async', '').lower() in ('1', 'true', 'yes')
         
-        text = extract_text_from_file(file_path)
+        # The upload is read straight from the (spooled) request stream
+        stream = file.stream
+        chunk_size = app.config['UPLOAD_CHUNK_SIZE']
+        upload_size = stream.seek(0, os.SEEK_END)
+        kind = document_type(stream, file.filename)
+        if kind not in EXTRACTORS:
+            return jsonify({'error': 'Unsupported file type. Please upload a text, PDF, Word (.docx) or HTML file'}), 400
+        with metrics.stage('extract'):
+            if kind == 'txt':
+                text_digest, text_length = fingerprint_text(iter_text_chunks(stream, chunk_size))
+            else:
+                # Other formats are keyed by their bytes and only parsed on a cache miss
+                text_digest, text_length = fingerprint_document(stream, kind, chunk_size), None
         
-        if len(text) < 100:
-            return jsonify({'error': 'Text is too short. Please upload a larger file (minimum 100 characters)'}), 400
+        if text_length is not None and text_length < 100:
+            return text_too_short()
         
-        num_sentences = int(request.form.get('summary_length', 5))
-        summary = summarize_text(text, num_sentences)
+        # Repeat uploads skip the NLTK pipeline entirely
+        cache_key = make_cache_key(text_digest, num_sentences, num_questions, engine)
+        result = result_cache.get(cache_key)
+        user_id = session['user_id']
         
-        num_questions = int(request.form.get('quiz_questions', 5))
-        quiz = generate_quiz(text, num_questions)
+        # Text of a non-text upload, kept once the near-duplicate lookup has extracted it
+        extracted = signature = None
         
-        keywords = extract_keywords(text, num_keywords=10)
+        def document_text():
+            return iter(extracted) if extracted is not None else reread(stream, kind, chunk_size)
         
-        # Save to database
-        conn = sqlite3.connect('study_helper.db')
-        c = conn.cursor()
-        c.execute('''INSERT INTO summaries 
-                     (user_id, title, summary, keywords, original_length, summary_length)
-                     VALUES (?, ?, ?, ?, ?, ?)''',
-                  (session['user_id'], file.filename, summary, 
-                   json.dumps(keywords), len(text), len(summary)))
-        summary_id = c.lastrowid
-        conn.commit()
-        conn.close()
+        def find_near_duplicate():
+            """Result of a near copy (a new header, a re-exported PDF) the user processed before, or None
+
+            Called only once the upload is admitted, since a non-text upload
+            is extracted here, before it is analyzed.
+            """
+            nonlocal extracted, signature
+            if not near_duplicate_index.enabled:
+                return None
+            with metrics.stage('near_duplicate'):
+                if kind != 'txt':
+                    extracted = list(document_text())
+                signature = near_duplicate_index.signature(document_text())
+                return reuse_near_duplicate(user_id, signature, num_sentences, num_questions, engine)
+        
+        if run_async:
+            if result is None:
+                def on_result(result):
+                    remember_result(cache_key, text_digest, user_id, signature, result)
+                    return saved_result(save_summary(user_id, file.filename, result), result)
+                
+                # The job holds a slot from before its text is extracted until it is stored,
+                # so queued jobs are bounded like every other pipeline
+                ticket = admission.acquire(upload_size, fast_lane_allowed(kind))
+                submitted = False
+                try:
+                    result = find_near_duplicate()
+                    if result is None:
+                        text = ''.join(document_text())
+                        if len(text) < 100:
+                            return text_too_short()
+                        job_id = job_manager.submit(user_id, file.filename, run_pipeline,
+                                                    text, num_sentences, num_questions, engine,
+                                                    on_result=on_result, on_finish=ticket.release)
+                        submitted = True
+                finally:
+                    if not submitted:
+                        ticket.release()
+            if result is not None:
+                job_id = job_manager.record(user_id, file.filename,
+                                            saved_result(save_summary(user_id, file.filename, result), result))
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status_url': url_for('job_status', job_id=job_id)
+            }), 202
+        
+        if stream_format is not None:
+            # Keywords and summary go out as soon as they are ready, then each question
+            ticket = remember = None
+            if result is None:
+                # The slot is held until the stream is closed, not just until the view returns
+                ticket = admission.acquire(upload_size, fast_lane_allowed(kind))
+                try:
+                    result = find_near_duplicate()
+                    text = ''.join(document_text()) if result is None else None
+                except BaseException:
+                    ticket.release()
+                    raise
+                if result is not None:
+                    # Answered by a near copy, so there is no pipeline to hold the slot for
+                    ticket.release()
+                    ticket = None
+                elif len(text) < 100:
+                    ticket.release()
+                    return text_too_short()
+            if result is None:
+                events = iter_pipeline(text, num_sentences, num_questions, engine)
+                remember = lambda payload: remember_result(cache_key, text_digest, user_id, signature, payload)
+            else:
+                events = iter_result_events(result)
+            graded = result is None or bool(result.get('quiz_pool'))
+            response = Response(stream_process_events(events, stream_format, user_id, file.filename, remember,
+                                                      graded),
+                                mimetype=STREAM_MIMETYPES[stream_format],
+                                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+            if ticket is not None:
+                response.call_on_close(ticket.release)
+            return response
         
-        if file_path and os.path.exists(file_path):
-            os.remove(file_path)
+        if result is None:
+            with admission.slot(upload_size, fast_lane_allowed(kind)):
+                result = find_near_duplicate()
+                if result is None:
+                    if (kind == 'txt' and engine == 'frequency'
+                            and text_length >= app.config['WINDOWED_SUMMARY_MIN_CHARS']):
+                        result = run_pipeline_windowed(lambda: reread(stream, kind, chunk_size), num_sentences,
+                                                       num_questions)
+                    else:
+                        # Without a near-duplicate lookup, extracted text streams into the
+                        # analyzer while later PDF pages are still parsed
+                        result = run_pipeline(document_text(), num_sentences, num_questions, engine)
+                    if result['original_length'] < 100:
+                        return text_too_short()
+                    remember_result(cache_key, text_digest, user_id, signature, result)
+        
+        summary_id = save_summary(user_id, file.filename, result)
         
         return jsonify({
             'success': True,
-            'summary_id': summary_id,
-            'summary': summary,
-            'quiz': quiz,
-            'keywords': keywords,
-            'original_length': len(text),
-            'summary_length': len(summary)
+            **saved_result(summary_id, result)
         })
         
+    except ExtractionError as e:
+        return jsonify({'error': str(e)}), 400
+    except AdmissionRejected as e:
+        return busy_response(e.retry_after)
     except Exception as e:
         print(f"Process error: {e}")
         print(traceback.format_exc())
-        if file_path and os.path.exists(file_path):
-            os.remove(file_path)
         return jsonify({'error': f'An error occurred: {str(e)}'}), 500
 
+def iter_batch_documents(files, chunk_size):
+    """Yield (title, digest, text, error) for each uploaded file, expanding zip archives
+
+    Documents may be text, PDF, DOCX or HTML, inside an archive or not.
+    digest is the document's fingerprint_document, the result cache key
+    /process and the batch CLI use for the same file. A
+    document that cannot be read, or whose text is too long, is yielded with
+    its error instead of text, so it fails on its own; only the batch limits
+    (documents, archive bytes and extracted characters) fail the whole batch.
+    """
+    max_files = app.config['BATCH_MAX_FILES']
+    budget = app.config['BATCH_MAX_UNCOMPRESSED']
+    text_budget = app.config['BATCH_MAX_CHARS']
+    
+    def charge(text):
+        nonlocal text_budget
+        text_budget -= len(text)
+        if text_budget < 0:
+            raise ValueError('Batch is too large once extracted')
+        return text
+    
+    count = 0
+    for file in files:
+        stream = file.stream
+        kind = document_type(stream, file.filename)
+        if kind == 'zip':
+            try:
+                archive = zipfile.ZipFile(stream)
+            except zipfile.BadZipFile as e:
+                count += 1
+                if count > max_files:
+                    raise ValueError(f'A batch may contain at most {max_files} documents')
+                yield file.filename, None, None, str(e)
+                continue
+            with archive:
+                for member in archive.infolist():
+                    if member.is_dir():
+                        continue
+                    budget -= member.file_size
+                    if budget < 0:
+                        raise ValueError('Batch is too large once extracted')
+                    count += 1
+                    if count > max_files:
+                        raise ValueError(f'A batch may contain at most {max_files} documents')
+                    try:
+                        with archive.open(member) as f:
+                            member_kind = document_type(f, member.filename)
+                            digest = fingerprint_document(f, member_kind, chunk_size)
+                            text = ''.join(document_chunks(f, member_kind, chunk_size))
+                    except (ExtractionError, zipfile.BadZipFile) as e:
+                        yield member.filename, None, None, str(e)
+                    else:
+                        yield member.filename, digest, charge(text), None
+        else:
+            count += 1
+            if count > max_files:
+                raise ValueError(f'A batch may contain at most {max_files} documents')
+            digest = fingerprint_document(stream, kind, chunk_size)
+            try:
+                text = ''.join(document_chunks(stream, kind, chunk_size))
+            except ExtractionError as e:
+                yield file.filename, None, None, str(e)
+            else:
+                yield file.filename, digest, charge(text), None
+
+@app.route('/process-batch', methods=['POST'])
+def process_batch():
+    """Process many files, or a zip archive, across the analyzer pool
+
+    Reading the uploads is admitted as one document of their total size.
+    Each document that needs the pipeline is then admitted on its own as it
+    is handed to the pool, and at most BATCH_MAX_IN_FLIGHT of a batch are
+    in the pool at once, so a large batch neither slips past the document
+    cap nor queues ahead of everyone else's work. Results are streamed back
+    as NDJSON, one line per document in the order they finish. Each
+    summaries row is committed on its own as its document finishes, so no
+    write transaction is held while the pool works or the client reads.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Please login first', 'redirect': '/login'}), 401
+    
+    files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    if not files:
+        return jsonify({'error': 'No files uploaded'}), 400
+    
+    try:
+        num_sentences, num_questions = pipeline_size_args()
+        engine = summary_engine_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    user_id = session['user_id']
+    chunk_size = app.config['UPLOAD_CHUNK_SIZE']
+    # Read every document up front; uploads are closed once the view returns
+    ready, pending = [], deque()
+    try:
+        # Batches may hold archives and DOCX files, so they never take the fast lane
+        with admission.slot(sum(f.stream.seek(0, os.SEEK_END) for f in files), fast=False):
+            for title, digest, text, error in iter_batch_documents(files, chunk_size):
+                if error is not None:
+                    ready.append((title, None, None, error, False))
+                    continue
+                if len(text) < 100:
+                    ready.append((title, None, None, 'Text is too short (minimum 100 characters)', False))
+                    continue
+                cache_key = make_cache_key(digest, num_sentences, num_questions, engine)
+                result = result_cache.get(cache_key)
+                signature = None
+                if result is None:
+                    signature = near_duplicate_index.signature([text])
+                    result = reuse_near_duplicate(user_id, signature, num_sentences, num_questions, engine)
+                if result is not None:
+                    ready.append((title, None, result, None, False))
+                    continue
+                pending.append((title, text, (cache_key, digest, user_id, signature)))
+    except AdmissionRejected as e:
+        return busy_response(e.retry_after)
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def finished():
+        yield from ready
+        in_flight = {}
+        try:
+            while pending or in_flight:
+                if pending and len(in_flight) < app.config['BATCH_MAX_IN_FLIGHT']:
+                    title, text, source = pending[0]
+                    try:
+                        ticket = admission.acquire(len(text))
+                    except AdmissionRejected:
+                        # Wait for our own documents to free slots; with none running, give up on this one
+                        if not in_flight:
+                            pending.popleft()
+                            yield title, source, None, 'Server is busy, please try again in a moment', False
+                            continue
+                    else:
+                        pending.popleft()
+                        try:
+                            future = job_manager.executor.submit(run_pipeline, text, num_sentences, num_questions,
+                                                                 engine)
+                        except BaseException:
+                            ticket.release()
+                            raise
+                        future.add_done_callback(lambda f, ticket=ticket: ticket.release())
+                        in_flight[future] = (title, source)
+                        continue
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    title, source = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        yield title, source, None, str(e), False
+                        continue
+                    yield title, source, result, None, True
+        finally:
+            # The client went away: documents not yet started give their slots back
+            for future in in_flight:
+                future.cancel()
+    
+    def generate():
+        processed = failed = 0
+        try:
+            for title, source, result, error, is_fresh in finished():
+                if error is not None:
+                    failed += 1
+                    yield json.dumps({'title': title, 'error': error}) + '\n'
+                    continue
+                processed += 1
+                if is_fresh:
+                    remember_result(*source, result)
+                summary_id = save_summary(user_id, title, result)
+                yield json.dumps({'title': title, **saved_result(summary_id, result)}) + '\n'
+            yield json.dumps({'done': True, 'processed': processed, 'failed': failed}) + '\n'
+        except Exception as e:
+            print(f"Batch process error: {e}")
+            print(traceback.format_exc())
+            yield json.dumps({'done': True, 'error': f'An error occurred: {str(e)}'}) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Poll an async /process job, optionally waiting up to ?wait= seconds"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        wait = min(float(request.args.get('wait', 0)), app.config['JOB_WAIT_MAX_SECONDS'])
+        if wait > 0:
+            job = job_manager.wait(job_id, session['user_id'], wait)
+        else:
+            job = job_manager.get(job_id, session['user_id'])
+        
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job_response(job))
+    except Exception as e:
+        print(f"Job status error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/cache-stats')
+def cache_stats():
+    """Report result and paragraph cache hit/miss counters"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    return jsonify({**result_cache.stats(), 'paragraphs': paragraph_cache.stats(),
+                    'near_duplicates': near_duplicate_index.stats(), 'cooccurrence': cooccurrence_index.stats()})
+
+@app.route('/admission-stats')
+def admission_stats():
+    """Report running and queued documents and queue wait times for each processing lane"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    return jsonify(admission.stats())
+
+def encode_cursor(row):
+    """Opaque pagination cursor for the last row of a page"""
+    raw = json.dumps([row['created_at'], row['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor):
+    """Return (created_at, id) from a cursor, or raise ValueError"""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(created_at, str) or not isinstance(row_id, int):
+        raise ValueError('Invalid cursor')
+    return created_at, row_id
+
+def page_args():
+    """Read ?limit= and ?cursor= for a keyset-paginated listing"""
+    limit = max(1, min(int(request.args.get('limit', app.config['PAGE_SIZE'])), app.config['MAX_PAGE_SIZE']))
+    cursor = request.args.get('cursor')
+    return limit, decode_cursor(cursor) if cursor else None
+
+def conditional_json(payload):
+    """JSON response with an ETag, answered with 304 when If-None-Match matches"""
+    response = jsonify(payload)
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @app.route('/my-summaries')
 def my_summaries():
-    """Get user's saved summaries"""
+    """Get a page of the user's saved summaries, without summary bodies"""
     try:
         if 'user_id' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        conn = sqlite3.connect('study_helper.db')
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute('''SELECT id, title, summary, keywords, created_at 
-                     FROM summaries WHERE user_id = ? 
-                     ORDER BY created_at DESC''', (session['user_id'],))
-        summaries = [dict(row) for row in c.fetchall()]
-        conn.close()
+        try:
+            limit, before = page_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        with db.connection() as conn:
+            rows = database.list_summaries(conn, session['user_id'], limit + 1, before)
         
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        summaries = [dict(row) for row in rows[:limit]]
         for s in summaries:
             s['keywords'] = json.loads(s['keywords'])
         
-        return jsonify({'summaries': summaries})
+        return conditional_json({'summaries': summaries, 'next_cursor': next_cursor})
     except Exception as e:
         print(f"My summaries error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/summaries/<int:summary_id>')
+def get_summary(summary_id):
+    """Get one saved summary with its full text"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        with db.connection() as conn:
+            row = database.get_summary(conn, summary_id, session['user_id'])
+        
+        if row is None:
+            return jsonify({'error': 'Summary not found'}), 404
+        
+        summary = dict(row)
+        summary['keywords'] = json.loads(summary['keywords'])
+        return conditional_json(summary)
+    except Exception as e:
+        print(f"Get summary error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/summaries/<int:summary_id>/quiz')
+def sample_quiz(summary_id):
+    """A fresh quiz drawn from the summary's stored pool; the same seed gives the same quiz"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        try:
+            num_questions = max(int(request.args.get('questions', 5)), 0)
+            seed = int(request.args['seed']) if 'seed' in request.args else random.SystemRandom().randrange(2 ** 32)
+        except ValueError:
+            return jsonify({'error': 'questions and seed must be integers'}), 400
+        
+        with db.connection() as conn:
+            pool_size = database.get_quiz_pool_size(conn, summary_id, session['user_id'])
+            if pool_size is None:
+                return jsonify({'error': 'Summary not found'}), 404
+            rng = random.Random(seed)
+            positions = quiz_positions(pool_size, num_questions, rng)
+            questions = database.get_quiz_questions(conn, summary_id, positions)
+        
+        quiz = []
+        for position in positions:
+            row = questions[position]
+            options = json.loads(row['options'])
+            rng.shuffle(options)
+            quiz.append({'id': position, 'question': row['question'], 'options': options})
+        
+        return jsonify({'summary_id': summary_id, 'seed': seed, 'quiz': quiz,
+                        'quiz_token': quiz_token(summary_id, len(positions), seed)})
+    except Exception as e:
+        print(f"Sample quiz error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/search')
+def search():
+    """Ranked full-text search over the user's summaries, titles and keywords"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        query = database.fts_query(request.args.get('q', ''))
+        if query is None:
+            return jsonify({'error': 'Search query is required'}), 400
+        
+        limit = max(1, min(int(request.args.get('limit', app.config['PAGE_SIZE'])), app.config['MAX_PAGE_SIZE']))
+        offset = max(0, int(request.args.get('offset', 0)))
+        
+        with db.connection() as conn:
+            rows = database.search_summaries(conn, session['user_id'], query, limit + 1, offset)
+        
+        results = [dict(row) for row in rows[:limit]]
+        return jsonify({
+            'results': results,
+            'next_offset': offset + limit if len(rows) > limit else None
+        })
+    except Exception as e:
+        print(f"Search error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/my-results')
 def my_results():
-    """Get user's quiz results"""
+    """Get a page of the user's quiz results"""
     try:
         if 'user_id' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        conn = sqlite3.connect('study_helper.db')
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute('''SELECT score, total_questions, created_at 
-                     FROM quiz_results WHERE user_id = ? 
-                     ORDER BY created_at DESC''', (session['user_id'],))
-        results = [dict(row) for row in c.fetchall()]
-        conn.close()
+        try:
+            limit, before = page_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        with db.connection() as conn:
+            rows = database.list_quiz_results(conn, session['user_id'], limit + 1, before)
         
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        results = [dict(row) for row in rows[:limit]]
         for r in results:
             r['total'] = r['total_questions']
-            r['percentage'] = round((r['score'] / r['total_questions']) * 100) if r['total_questions'] > 0 else 0
+            r['percentage'] = average_percentage(r['score'], r['total_questions'])
         
-        return jsonify({'results': results})
+        return conditional_json({'results': results, 'next_cursor': next_cursor})
     except Exception as e:
         print(f"My results error: {e}")
         return jsonify({'error': str(e)}), 500
 
+def rounded_percentage(value):
+    return None if value is None else round(value)
+
+def average_percentage(correct, questions):
+    return round(correct / questions * 100) if questions > 0 else 0
+
+@app.route('/my-stats')
+def my_stats():
+    """Dashboard statistics, read from the user's maintained user_stats row"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        with db.connection() as conn:
+            row = database.get_user_stats(conn, session['user_id'])
+        
+        # Users who have not done anything yet have no row
+        stats = dict(row) if row is not None else {
+            'summaries': 0, 'characters': 0, 'last_summary_at': None, 'quizzes': 0, 'questions': 0,
+            'correct': 0, 'best_percentage': None, 'last_quiz_at': None, 'recent_scores': '[]'
+        }
+        return conditional_json({
+            'summaries': stats['summaries'],
+            'characters_processed': stats['characters'],
+            'last_summary_at': stats['last_summary_at'],
+            'quizzes': stats['quizzes'],
+            'questions_answered': stats['questions'],
+            'correct_answers': stats['correct'],
+            'average_percentage': average_percentage(stats['correct'], stats['questions']),
+            'best_percentage': rounded_percentage(stats['best_percentage']),
+            'last_quiz_at': stats['last_quiz_at'],
+            'recent_results': [{'score': score, 'total_questions': total,
+                                'percentage': average_percentage(score, total)}
+                               for score, total in json.loads(stats['recent_scores'])]
+        })
+    except Exception as e:
+        print(f"My stats error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/summaries/<int:summary_id>/stats')
+def summary_stats(summary_id):
+    """Quiz attempt statistics for one of the user's summaries"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        with db.connection() as conn:
+            row = database.get_summary_quiz_stats(conn, summary_id, session['user_id'])
+        
+        if row is None:
+            return jsonify({'error': 'Summary not found'}), 404
+        
+        return conditional_json({
+            'summary_id': row['summary_id'],
+            'attempts': row['attempts'],
+            'questions_answered': row['questions'],
+            'correct_answers': row['correct'],
+            'average_percentage': average_percentage(row['correct'], row['questions']),
+            'best_percentage': rounded_percentage(row['best_percentage']),
+            'last_percentage': rounded_percentage(row['last_percentage']),
+            'last_attempt_at': row['last_attempt_at']
+        })
+    except Exception as e:
+        print(f"Summary stats error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/save-quiz-result', methods=['POST'])
 def save_quiz_result():
     """Save quiz result to database"""
@@ -397,18 +1010,51 @@ def save_quiz_result():
             return jsonify({'error': 'Not authenticated'}), 401
         
         data = request.json
+        user_id = session['user_id']
+        summary_id = data.get('summary_id')
+        answers = data.get('answers')
+        correct_answers = None
         
-        conn = sqlite3.connect('study_helper.db')
-        c = conn.cursor()
-        c.execute('''INSERT INTO quiz_results 
-                     (user_id, summary_id, score, total_questions)
-                     VALUES (?, ?, ?, ?)''',
-                  (session['user_id'], data.get('summary_id'), 
-                   data['score'], data['total_questions']))
-        conn.commit()
-        conn.close()
+        with db.connection() as conn:
+            pool_size = database.get_quiz_pool_size(conn, summary_id, user_id) if summary_id is not None else None
+            if answers is not None:
+                if not pool_size:
+                    return jsonify({'error': 'This summary has no stored quiz to check answers against'}), 400
+                # Answers are graded against the quiz that was issued, never a subset the client picks
+                try:
+                    issued_summary, num_questions, seed = quiz_signer.loads(data.get('quiz_token') or '')
+                except BadData:
+                    return jsonify({'error': 'quiz_token is missing or invalid'}), 400
+                if str(issued_summary) != str(summary_id):
+                    return jsonify({'error': 'quiz_token belongs to another summary'}), 400
+                positions = quiz_positions(pool_size, num_questions, random.Random(seed) if seed is not None else None)
+                try:
+                    answers = {int(question_id): answer for question_id, answer in answers.items()}
+                except (AttributeError, ValueError):
+                    return jsonify({'error': 'answers must map question ids to the chosen options'}), 400
+                if set(answers) != set(positions):
+                    return jsonify({'error': 'answers must cover exactly the questions of the quiz'}), 400
+                questions = database.get_quiz_questions(conn, summary_id, positions)
+                if len(questions) != len(answers):
+                    return jsonify({'error': 'Unknown question id'}), 400
+                # Grading reveals the answers, so each issued quiz is graded once
+                if not database.claim_quiz(conn, summary_id, '' if seed is None else str(seed)):
+                    return jsonify({'error': 'This quiz was already graded; ask for a new one'}), 409
+                correct_answers = {question_id: json.loads(row['options'])[row['answer']]
+                                   for question_id, row in questions.items()}
+                score = sum(answers[question_id] == answer for question_id, answer in correct_answers.items())
+                total_questions = len(answers)
+            elif pool_size:
+                # Summaries with a stored pool are graded here, never by the client
+                return jsonify({'error': 'answers are required for this quiz'}), 400
+            else:
+                score, total_questions = data['score'], data['total_questions']
+            database.insert_quiz_result(conn, user_id, summary_id, score, total_questions)
         
-        return jsonify({'success': True})
+        body = {'success': True, 'score': score, 'total_questions': total_questions}
+        if correct_answers is not None:
+            body['correct_answers'] = correct_answers
+        return jsonify(body)
     except Exception as e:
         print(f"Save quiz result error: {e}")
         return jsonify({'error': str(e)}), 500
@@ -420,19 +1066,117 @@ def delete_summary(summary_id):
         if 'user_id' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        conn = sqlite3.connect('study_helper.db')
-        c = conn.cursor()
-        c.execute('DELETE FROM summaries WHERE id = ? AND user_id = ?',
-                  (summary_id, session['user_id']))
-        conn.commit()
-        conn.close()
+        with db.connection() as conn:
+            database.delete_summary(conn, summary_id, session['user_id'])
         
         return jsonify({'success': True})
     except Exception as e:
         print(f"Delete summary error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute user_stats and summary_quiz_stats from the summaries and quiz_results tables"""
+    db.migrate()
+    started = time.perf_counter()
+    with db.connection() as conn:
+        database.rebuild_stats(conn)
+    print(f"✓ Statistics rebuilt in {time.perf_counter() - started:.2f}s")
+
+def create_app():
+    """Prepare the app for serving and report the cold-start budget
+
+    Checks and warms NLTK and migrates the database. Call it once before
+    workers fork (gunicorn --preload wsgi:app) so the loaded tokenizer and
+    stopword set are shared copy-on-write.
+    """
+    if 'STARTUP_TIMINGS' in app.config:
+        return app
+    
+    started = time.perf_counter()
+    warm_nltk()
+    nltk_ready = time.perf_counter()
+    init_db()
+    os.makedirs('templates', exist_ok=True)
+    os.makedirs('static', exist_ok=True)
+    ready = time.perf_counter()
+    
+    timings = {
+        'import_s': round(_IMPORT_FINISHED - _IMPORT_STARTED, 4),
+        'nltk_warmup_s': round(nltk_ready - started, 4),
+        'db_migrate_s': round(ready - nltk_ready, 4),
+        'startup_s': round(ready - _IMPORT_STARTED, 4),
+        'first_response_s': None,
+        'budget_s': app.config['COLD_START_BUDGET_S']
+    }
+    app.config['STARTUP_TIMINGS'] = timings
+    print(f"✓ Started in {timings['startup_s']}s (import {timings['import_s']}s, "
+          f"NLTK {timings['nltk_warmup_s']}s, database {timings['db_migrate_s']}s)")
+    if timings['startup_s'] > timings['budget_s']:
+        print(f"✗ Start-up exceeded the {timings['budget_s']}s cold-start budget")
+    return app
+
+@app.after_request
+def record_first_response(response):
+    """Record time-to-first-response once per process"""
+    timings = app.config.get('STARTUP_TIMINGS')
+    if timings is not None and timings['first_response_s'] is None:
+        timings['first_response_s'] = round(time.perf_counter() - _IMPORT_STARTED, 4)
+        print(f"✓ First response {timings['first_response_s']}s after import")
+    return response
+
+@app.route('/healthz')
+def healthz():
+    """Liveness check with start-up timings"""
+    return jsonify({'status': 'ok', 'startup': app.config.get('STARTUP_TIMINGS'),
+                    'password_hasher': password_hasher.stats()})
+
+@app.before_request
+def start_request_metrics():
+    """Count the request as in flight and start collecting its stage timings"""
+    if metrics.registry.enabled:
+        g.metrics_started = time.perf_counter()
+        metrics.registry.request_started()
+        if app.config['SERVER_TIMING']:
+            g.server_timing = metrics.begin_server_timing()
+
+@app.after_request
+def finish_request_metrics(response):
+    """Record route latency and add the Server-Timing header"""
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        metrics.registry.request_finished(request.endpoint or 'unmatched', response.status_code, elapsed)
+        token = g.pop('server_timing', None)
+        if token is not None:
+            metrics.add_server_timing('total', elapsed)
+            response.headers['Server-Timing'] = metrics.end_server_timing(token)
+    return response
+
+@app.teardown_request
+def abort_request_metrics(error):
+    """Settle the in-flight gauge for requests that raised past after_request"""
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        metrics.registry.request_finished(request.endpoint or 'unmatched', 500, time.perf_counter() - started)
+    token = g.pop('server_timing', None)
+    if token is not None:
+        metrics.end_server_timing(token)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Metrics for this worker process in Prometheus text format"""
+    if not metrics.registry.enabled:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+_IMPORT_FINISHED = time.perf_counter()
+
 if __name__ == '__main__':
+    if '--download-nltk' in sys.argv:
+        download_nltk_data()
+        sys.exit(0)
+    create_app()
     print("="*50)
     print("Study Helper App Starting...")
     print("="*50)
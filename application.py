@@ -1,120 +1,25 @@
-import os
-import nltk
-from flask import Flask, render_template, request, jsonify
-from nltk.tokenize import sent_tokenize, word_tokenize
-from nltk.corpus import stopwords
-from collections import Counter
-import random
-import re
+import time
+_IMPORT_STARTED = time.perf_counter()
 
-# Download required NLTK data
-def ensure_nltk_data():
-    """Ensure all required NLTK data is downloaded"""
-    required_data = [
-        ('tokenizers/punkt', 'punkt'),
-        ('tokenizers/punkt_tab', 'punkt_tab'),
-        ('corpora/stopwords', 'stopwords')
-    ]
-    
-    for path, name in required_data:
-        try:
-            nltk.data.find(path)
-        except LookupError:
-            print(f"Downloading {name}...")
-            nltk.download(name, quiet=True)
+import sys
+from flask import Flask, Request, current_app, render_template, request, jsonify
+import sentence_scoring
+import tempfile
+from engine import (DocumentAnalysis, download_nltk_data, extract_keywords, generate_quiz, iter_text_chunks,
+                    summarize_text, warm_nltk)
+
+class SpooledUploadRequest(Request):
+    """আপলোড মেমরিতে রাখা, UPLOAD_SPOOL_MAX_SIZE এর বেশি হলে টেম্প ফাইলে"""
 
-# Call this at startup
-ensure_nltk_data()
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=current_app.config['UPLOAD_SPOOL_MAX_SIZE'], mode='rb+')
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'uploads'
+app.request_class = SpooledUploadRequest
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  
-
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-def extract_text_from_file(file_path):
-    """ফাইল থেকে টেক্সট বের করা"""
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        return f.read()
-
-def summarize_text(text, num_sentences=5):
-    """টেক্সট সামারাইজ করা - সবচেয়ে গুরুত্বপূর্ণ বাক্য বের করা"""
-    
-    sentences = sent_tokenize(text)
-    
-    if len(sentences) <= num_sentences:
-        return text
-    
-    stop_words = set(stopwords.words('english'))
-    words = word_tokenize(text.lower())
-    words = [word for word in words if word.isalnum() and word not in stop_words]
-    
-    word_freq = Counter(words)
-    
-    sentence_scores = {}
-    for sentence in sentences:
-        sentence_words = word_tokenize(sentence.lower())
-        score = sum(word_freq.get(word, 0) for word in sentence_words if word.isalnum())
-        sentence_scores[sentence] = score
-    
-    top_sentences = sorted(sentence_scores, key=sentence_scores.get, reverse=True)[:num_sentences]
-    
-    summary = []
-    for sentence in sentences:
-        if sentence in top_sentences:
-            summary.append(sentence)
-    
-    return ' '.join(summary)
-
-def extract_keywords(text, num_keywords=10):
-    """টেক্সট থেকে মূল শব্দ বের করা"""
-    stop_words = set(stopwords.words('english'))
-    words = word_tokenize(text.lower())
-    words = [word for word in words if word.isalnum() and word not in stop_words and len(word) > 3]
-    
-    word_freq = Counter(words)
-    return [word for word, freq in word_freq.most_common(num_keywords)]
-
-def generate_quiz(text, num_questions=5):
-    """টেক্সট থেকে MCQ তৈরি করা"""
-    sentences = sent_tokenize(text)
-    keywords = extract_keywords(text, num_keywords=20)
-    
-    quiz = []
-    used_sentences = set()
-    
-    for i in range(min(num_questions, len(sentences))):
-        suitable_sentences = [s for s in sentences if s not in used_sentences and any(kw in s.lower() for kw in keywords)]
-        
-        if not suitable_sentences:
-            break
-        
-        sentence = random.choice(suitable_sentences)
-        used_sentences.add(sentence)
-        
-        sentence_words = word_tokenize(sentence.lower())
-        important_words = [w for w in sentence_words if w in keywords and len(w) > 4]
-        
-        if not important_words:
-            continue
-        
-        correct_answer = random.choice(important_words)
-        question_text = re.sub(r'\b' + correct_answer + r'\b', '__', sentence, flags=re.IGNORECASE)
-        
-        wrong_options = [w for w in keywords if w != correct_answer]
-        random.shuffle(wrong_options)
-        wrong_options = list(set(wrong_options))[:3]
-        
-        all_options = wrong_options + [correct_answer]
-        random.shuffle(all_options)
-        
-        quiz.append({
-            'question': question_text,
-            'options': all_options,
-            'correct_answer': correct_answer
-        })
-    
-    return quiz
+app.config['UPLOAD_SPOOL_MAX_SIZE'] = 1024 * 1024
+app.config['UPLOAD_CHUNK_SIZE'] = 64 * 1024
+app.config['SUMMARY_ENGINE'] = 'frequency'
 
 @app.route('/')
 def index():
@@ -124,7 +29,6 @@ def index():
 @app.route('/process', methods=['POST'])
 def process_file():
     """ফাইল প্রসেস করা"""
-    file_path = None 
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'কোনো ফাইল পাওয়া যায়নি'}), 400
@@ -133,38 +37,71 @@ def process_file():
         if file.filename == '':
             return jsonify({'error': 'ফাইল সিলেক্ট করুন'}), 400
         
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-        file.save(file_path)
+        engine = request.form.get('summary_engine', app.config['SUMMARY_ENGINE'])
+        if engine not in sentence_scoring.ENGINES:
+            return jsonify({'error': f"অজানা সামারি ইঞ্জিন '{engine}'"}), 400
+        if engine in sentence_scoring.VECTOR_ENGINES and not sentence_scoring.available():
+            return jsonify({'error': f"'{engine}' ইঞ্জিনের জন্য numpy আর scipy দরকার"}), 400
         
-        text = extract_text_from_file(file_path)
+        doc = DocumentAnalysis(iter_text_chunks(file.stream, app.config['UPLOAD_CHUNK_SIZE']))
         
-        if len(text) < 100:
+        if doc.char_count < 100:
             return jsonify({'error': 'টেক্সট খুব ছোট। আরো বড় ফাইল দিন। (ন্যূনতম ১০০ অক্ষর)'}), 400
         
         num_sentences = int(request.form.get('summary_length', 5))
-        summary = summarize_text(text, num_sentences)
+        summary = summarize_text(doc, num_sentences, engine)
         
         num_questions = int(request.form.get('quiz_questions', 5))
-        quiz = generate_quiz(text, num_questions)
+        quiz = generate_quiz(doc, num_questions)
         
-        keywords = extract_keywords(text, num_keywords=10)
-        
-        if file_path and os.path.exists(file_path):
-            os.remove(file_path)
+        keywords = extract_keywords(doc, num_keywords=10)
         
         return jsonify({
             'success': True,
             'summary': summary,
             'quiz': quiz,
             'keywords': keywords,
-            'original_length': len(text),
+            'original_length': doc.char_count,
             'summary_length': len(summary)
         })
     
     except Exception as e:
-        if file_path and os.path.exists(file_path):
-            os.remove(file_path)
         return jsonify({'error': f'একটি সমস্যা হয়েছে: {str(e)}'}), 500
 
+def create_app():
+    """সার্ভ করার জন্য অ্যাপ প্রস্তুত করা আর cold-start সময় জানানো
+
+    ওয়ার্কার fork হওয়ার আগে একবার ডাকুন, যাতে লোড করা টোকেনাইজার copy-on-write এ শেয়ার হয়।
+    """
+    if 'STARTUP_TIMINGS' in app.config:
+        return app
+    
+    started = time.perf_counter()
+    warm_nltk()
+    ready = time.perf_counter()
+    app.config['STARTUP_TIMINGS'] = {
+        'import_s': round(_IMPORT_FINISHED - _IMPORT_STARTED, 4),
+        'nltk_warmup_s': round(ready - started, 4),
+        'startup_s': round(ready - _IMPORT_STARTED, 4),
+        'first_response_s': None
+    }
+    print(f"✓ Started in {app.config['STARTUP_TIMINGS']['startup_s']}s")
+    return app
+
+@app.after_request
+def record_first_response(response):
+    """প্রতি প্রসেসে প্রথম রেসপন্সের সময় একবার রেকর্ড করা"""
+    timings = app.config.get('STARTUP_TIMINGS')
+    if timings is not None and timings['first_response_s'] is None:
+        timings['first_response_s'] = round(time.perf_counter() - _IMPORT_STARTED, 4)
+        print(f"✓ First response {timings['first_response_s']}s after import")
+    return response
+
+_IMPORT_FINISHED = time.perf_counter()
+
 if __name__ == '__main__':
+    if '--download-nltk' in sys.argv:
+        download_nltk_data()
+        sys.exit(0)
+    create_app()
     app.run(debug=True, port=5000)
\ No newline at end of file
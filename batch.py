@@ -0,0 +1,158 @@
+"""Summarize a directory tree of documents offline, on every core
+
+    python batch.py catalog/ --output summaries.jsonl
+    python batch.py catalog/ --database study_helper.db --user alice
+
+Files are spread over a multiprocessing pool in chunks; results stream
+out as they finish, either as JSON lines or bulk-loaded into the
+summaries table (and the result cache, so later uploads of the same
+files are answered without reprocessing).
+"""
+import argparse
+import fnmatch
+import json
+import multiprocessing
+import os
+import sys
+import time
+from functools import partial
+
+import database
+import engine
+import extractors
+from result_cache import ResultCache, make_cache_key
+
+MIN_TEXT_LENGTH = 100
+DEFAULT_PATTERNS = ['*.txt', '*.pdf', '*.docx', '*.html', '*.htm']
+
+
+def iter_documents(root, patterns):
+    """Paths under root whose names match any pattern, in a stable order"""
+    for directory, subdirs, files in os.walk(root):
+        subdirs.sort()
+        for name in sorted(files):
+            if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                yield os.path.join(directory, name)
+
+
+def process_document(path, root, num_sentences, num_questions, summary_engine):
+    """Run the pipeline on one file; errors are returned, not raised, so one bad file never stops a run"""
+    title = os.path.relpath(path, root)
+    try:
+        with open(path, 'rb') as f:
+            kind = extractors.document_type(f, path)
+            digest = extractors.fingerprint_document(f, kind)
+            text = ''.join(extractors.iter_document_text(f, kind, path=path))
+        if len(text) < MIN_TEXT_LENGTH:
+            return {'title': title, 'error': f'Text is too short (minimum {MIN_TEXT_LENGTH} characters)'}
+        result = engine.run_pipeline(text, num_sentences, num_questions, summary_engine)
+        return {'title': title, 'cache_key': make_cache_key(digest, num_sentences, num_questions, summary_engine),
+                'result': result}
+    except Exception as e:
+        return {'title': title, 'error': str(e)}
+
+
+def default_chunksize(total, workers):
+    """Same heuristic as Pool.map: about four chunks per worker"""
+    return max(1, total // (workers * 4))
+
+
+def write_jsonl(records, output):
+    f = sys.stdout if output == '-' else open(output, 'w', encoding='utf-8')
+    try:
+        for record in records:
+            line = {'title': record['title'], **record['result']} if 'result' in record else record
+            f.write(json.dumps(line) + '\n')
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+def load_into_database(records, path, username, commit_every):
+    """Insert summaries for username in batches of commit_every rows"""
+    db = database.Database(path, pool_size=1)
+    db.migrate()
+    cache = ResultCache(db)
+    with db.connection() as conn:
+        user = database.find_user(conn, username)
+    if user is None:
+        raise SystemExit(f"No such user '{username}'")
+
+    def flush(batch):
+        with db.connection() as conn:
+            for record in batch:
+                result = record['result']
+                summary_id = database.insert_summary(conn, user['id'], record['title'], result['summary'],
+                                                     json.dumps(result['keywords']), result['original_length'],
+                                                     result['summary_length'])
+                database.insert_quiz_pool(conn, summary_id, result['quiz_pool'])
+            cache.put_many(conn, ((record['cache_key'], record['result']) for record in batch))
+
+    batch = []
+    for record in records:
+        if 'error' in record:
+            continue
+        batch.append(record)
+        if len(batch) >= commit_every:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+
+def report_progress(records, total):
+    """Pass records through, printing progress and failures to stderr"""
+    started = time.perf_counter()
+    failed = 0
+    for done, record in enumerate(records, start=1):
+        if 'error' in record:
+            failed += 1
+            print(f"✗ {record['title']}: {record['error']}", file=sys.stderr)
+        if done % 100 == 0 or done == total:
+            elapsed = time.perf_counter() - started
+            print(f"{done}/{total} documents, {failed} failed, {done / elapsed:.1f} docs/s", file=sys.stderr)
+        yield record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('root', help='directory to walk')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--output', help="JSONL file to write, or '-' for stdout")
+    target.add_argument('--database', help='SQLite database to load the summaries into')
+    parser.add_argument('--user', help='owner of the loaded summaries (with --database)')
+    parser.add_argument('--pattern', action='append',
+                        help=f"file name glob to include (default {' '.join(DEFAULT_PATTERNS)})")
+    parser.add_argument('--summary-length', type=int, default=5)
+    parser.add_argument('--quiz-questions', type=int, default=5)
+    parser.add_argument('--engine', default='frequency', help='summary engine')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunksize', type=int, help='files per task sent to a worker (default: automatic)')
+    parser.add_argument('--commit-every', type=int, default=500, help='rows per transaction (with --database)')
+    args = parser.parse_args(argv)
+
+    if args.database and not args.user:
+        parser.error('--database needs --user')
+    try:
+        engine.check_engine(args.engine)
+    except ValueError as e:
+        parser.error(str(e))
+
+    paths = list(iter_documents(args.root, args.pattern or DEFAULT_PATTERNS))
+    if not paths:
+        raise SystemExit(f'No matching files under {args.root}')
+    chunksize = args.chunksize or default_chunksize(len(paths), args.workers)
+    print(f"Processing {len(paths)} files on {args.workers} workers, {chunksize} per task", file=sys.stderr)
+
+    work = partial(process_document, root=args.root, num_sentences=args.summary_length,
+                   num_questions=args.quiz_questions, summary_engine=args.engine)
+    with multiprocessing.Pool(args.workers, initializer=engine.warm_nltk) as pool:
+        records = report_progress(pool.imap_unordered(work, paths, chunksize), len(paths))
+        if args.output:
+            write_jsonl(records, args.output)
+        else:
+            load_into_database(records, args.database, args.user, args.commit_every)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Quiz distractor time against the size of the corpus co-occurrence index
+
+    python -m benchmarks.bench_distractors --terms 100000 --questions 50 --output distractors.json
+
+A corpus matrix of --terms terms is built from random co-occurrence
+counts, each term sharing sentences with up to KEEP_PER_TERM others, and
+includes the vocabulary of a synthetic --size document so its answers
+have corpus neighbours. For the document, --questions questions are then
+made twice from the same sentences and answers: with distractors from the
+document's and the corpus's co-occurrence, and with shuffled keywords
+only. The difference is the distractor cost. Counting the document's own
+co-occurrence and merging it into the corpus are timed too.
+"""
+import argparse
+import random
+import sys
+import time
+
+import cooccurrence
+import engine
+from benchmarks.corpus import SIZES, synthetic_text
+from benchmarks.report import metadata, write_report
+from cooccurrence import CooccurrenceMatrix, PairCounter, np
+
+
+def corpus_matrix(terms, rng):
+    """Random symmetric counts, denser for the more frequent (lower numbered) terms"""
+    size = len(terms)
+    partners = rng.zipf(1.5, size=size * cooccurrence.KEEP_PER_TERM // 2) % size
+    rows = rng.integers(0, size, size=len(partners))
+    keep = rows != partners
+    rows, cols = np.concatenate((rows[keep], partners[keep])), np.concatenate((partners[keep], rows[keep]))
+    keys, counts = np.unique(rows * size + cols, return_counts=True)
+    term_counts = np.bincount(rows, minlength=size).astype(np.float64) + 1
+    return CooccurrenceMatrix.from_pairs(terms, term_counts, keys // size, keys % size, counts.astype(np.float64))
+
+
+def quiz_inputs(doc, num_questions, seed):
+    """The sentences and answer words iter_quiz would pick"""
+    keywords = engine.extract_keywords(doc, num_keywords=20)
+    answer_words = {kw for kw in keywords if len(kw) > 4}
+    index = engine.build_keyword_index(doc, answer_words)
+    candidates = sorted(set().union(*index.values()))
+    chosen = random.Random(seed).sample(candidates, min(num_questions, len(candidates)))
+    return keywords, [(doc.sentences[i], [w for w in doc.sentence_tokens[i] if w in answer_words]) for i in chosen]
+
+
+def time_questions(inputs, keywords, related, repeats, seed):
+    best = None
+    for _ in range(repeats):
+        random.seed(seed)
+        started = time.perf_counter()
+        for position, (sentence, important_words) in enumerate(inputs):
+            engine.make_question(position, sentence, important_words, keywords, related)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--terms', type=int, default=100000)
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--size', choices=sorted(SIZES), default='64KB')
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    if not cooccurrence.available():
+        raise SystemExit('numpy is not installed')
+    engine.load_nltk()
+    rng = np.random.default_rng(args.seed)
+
+    doc = engine.DocumentAnalysis(synthetic_text(SIZES[args.size], seed=args.seed))
+    vocabulary = list(doc.word_freq)
+    terms = vocabulary + [f'term{i}' for i in range(max(args.terms - len(vocabulary), 0))]
+    started = time.perf_counter()
+    corpus = corpus_matrix(terms, rng)
+    build_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    counter = PairCounter(doc.keyword_ranking()[:cooccurrence.DOCUMENT_TERMS])
+    for words in doc.sentence_terms:
+        counter.add(words)
+    document = counter.matrix()
+    count_s = time.perf_counter() - started
+
+    index = cooccurrence.CooccurrenceIndex()
+    index.matrix = corpus
+    keywords, inputs = quiz_inputs(doc, args.questions, args.seed)
+    related = lambda word: index.related(word, document)
+    with_index = time_questions(inputs, keywords, related, args.repeats, args.seed)
+    keywords_only = time_questions(inputs, keywords, None, args.repeats, args.seed)
+
+    started = time.perf_counter()
+    corpus.merged([document])
+    merge_s = time.perf_counter() - started
+
+    result = {
+        'questions': len(inputs),
+        'with_cooccurrence_ms': with_index * 1000,
+        'keywords_only_ms': keywords_only * 1000,
+        'distractor_ms': (with_index - keywords_only) * 1000,
+        'document_count_ms': count_s * 1000,
+        'corpus_build_s': build_s,
+        'corpus_merge_s': merge_s,
+        'corpus_terms': len(corpus.terms),
+        'corpus_pairs': len(corpus.indices),
+        'corpus_bytes': corpus.nbytes(),
+    }
+    print(f"{len(inputs)} questions: {result['with_cooccurrence_ms']:.2f} ms with co-occurrence, "
+          f"{result['keywords_only_ms']:.2f} ms keywords only; "
+          f"counting the document {result['document_count_ms']:.1f} ms, "
+          f"merging it into {len(corpus.terms)} terms {merge_s * 1000:.0f} ms", file=sys.stderr)
+    write_report({
+        'meta': metadata(kind='distractors', terms=args.terms, size=args.size, seed=args.seed),
+        'results': [result]
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
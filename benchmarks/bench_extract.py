@@ -0,0 +1,70 @@
+"""PDF text extraction time against the number of worker processes
+
+    python -m benchmarks.bench_extract --pages 300 --workers 1 2 4 8 --output extract.json
+
+A synthetic PDF of --pages pages is extracted through the same page-parallel
+extractor /process uses, once per worker count, and the best of --repeats
+runs is compared with a single worker. Time to the first chunk of text is
+reported too: that is when the analyzer can start.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+from benchmarks.corpus import synthetic_pdf
+from benchmarks.report import metadata, write_report
+
+
+def time_extraction(extractors, data):
+    started = time.perf_counter()
+    first = None
+    chars = 0
+    for chunk in extractors.iter_document_text(io.BytesIO(data), 'pdf'):
+        if first is None:
+            first = time.perf_counter() - started
+        chars += len(chunk)
+    return time.perf_counter() - started, first, chars
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=300)
+    parser.add_argument('--workers', type=int, nargs='*', default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument('--pages-per-task', type=int)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    import extractors
+    if extractors.pypdf is None:
+        raise SystemExit('pypdf is not installed')
+    data = synthetic_pdf(args.pages, seed=args.seed)
+
+    results = []
+    for workers in args.workers:
+        extractor = extractors.PdfExtractor(workers, args.pages_per_task or extractors.PDF_PAGES_PER_TASK)
+        extractors.pdf_extractor = extractor
+        # Start the pool before timing, as a running server would have
+        time_extraction(extractors, data)
+        runs = [time_extraction(extractors, data) for _ in range(args.repeats)]
+        extractor.shutdown()
+        seconds, first_chunk, chars = min(runs)
+        results.append({'workers': workers, 'seconds': seconds, 'first_chunk_s': first_chunk,
+                        'pages_per_s': args.pages / seconds, 'chars': chars})
+        print(f"{workers} workers: {seconds:.2f}s ({args.pages / seconds:.0f} pages/s), "
+              f"first text after {first_chunk * 1000:.0f} ms", file=sys.stderr)
+
+    baseline = results[0]['seconds']
+    for result in results:
+        result['speedup'] = baseline / result['seconds']
+    write_report({
+        'meta': metadata(kind='extract', pages=args.pages, pdf_bytes=len(data), seed=args.seed),
+        'results': results
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Login throughput per core for each password hash method
+
+    python -m benchmarks.bench_login --methods scrypt pbkdf2:sha256:600000 --workers 16
+    python -m benchmarks.bench_login --hash-workers 2 --hash-queue 4 --duration 20
+
+For each method a user is registered, then --workers client threads post
+/login for --duration seconds through the in-process test client. Logins
+per second are divided by the hashing threads actually usable (the
+smaller of --hash-workers and the core count) to give a per-core figure;
+the single-threaded verify rate is reported alongside as the ceiling.
+Requests refused with 503 because the hashing queue was full are counted
+separately.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from benchmarks.report import metadata, percentile, write_report
+
+PASSWORD = 'correct horse battery staple'
+
+
+def verify_rate(method, seconds):
+    """Single-threaded verifications per second, with no app in the way"""
+    stored = generate_password_hash(PASSWORD, method)
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        check_password_hash(stored, PASSWORD)
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def run_logins(flask_app, username, workers, duration):
+    samples, lock = [], threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker():
+        client = flask_app.test_client()
+        local = []
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            status = client.post('/login', json={'username': username, 'password': PASSWORD}).status_code
+            local.append((time.perf_counter() - started, status))
+        with lock:
+            samples.extend(local)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.monotonic() - started
+
+
+def bench_method(app, method, args):
+    app.password_hasher = app.PasswordHasher(method, max_workers=args.hash_workers, max_queue=args.hash_queue)
+    # A fresh user per method, so logins never pay for a rehash
+    username = f'bench-{method}'
+    app.app.test_client().post('/register', json={'username': username, 'email': f'{username}@example.com',
+                                                  'password': PASSWORD})
+
+    samples, elapsed = run_logins(app.app, username, args.workers, args.duration)
+    latencies = sorted(latency for latency, status in samples if status == 200)
+    usable_cores = min(args.hash_workers, os.cpu_count() or 1)
+    logins_per_s = len(latencies) / elapsed
+    return {
+        'method': app.password_hasher.method_prefix,
+        'elapsed_s': elapsed,
+        'logins': len(latencies),
+        'busy_503': sum(1 for _, status in samples if status == 503),
+        'errors': sum(1 for _, status in samples if status not in (200, 503)),
+        'logins_per_s': logins_per_s,
+        'logins_per_s_per_core': logins_per_s / usable_cores,
+        'single_thread_verify_per_s': verify_rate(method, min(args.duration, 3.0)),
+        'p50_s': percentile(latencies, 50),
+        'p99_s': percentile(latencies, 99),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--methods', nargs='*', default=['scrypt', 'pbkdf2:sha256:600000'])
+    parser.add_argument('--workers', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--hash-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--hash-queue', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per method')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.TemporaryDirectory()
+    os.chdir(workdir.name)
+    import app
+    app.create_app()
+
+    results = []
+    for method in args.methods:
+        result = bench_method(app, method, args)
+        results.append(result)
+        print(f"{result['method']}: {result['logins_per_s']:.1f} logins/s "
+              f"({result['logins_per_s_per_core']:.1f}/core, ceiling {result['single_thread_verify_per_s']:.1f}), "
+              f"p99 {(result['p99_s'] or 0) * 1000:.0f} ms, {result['busy_503']} refused", file=sys.stderr)
+
+    write_report({
+        'meta': metadata(kind='login', workers=args.workers, hash_workers=args.hash_workers,
+                         hash_queue=args.hash_queue),
+        'results': results
+    }, args.output)
+
+    app.job_manager.shutdown()
+    os.chdir(os.path.dirname(workdir.name))
+    workdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Near-duplicate lookup time against the number of indexed documents
+
+    python -m benchmarks.bench_near_duplicates --documents 1000000 --queries 2000 --output near.json
+
+A throwaway database is filled with --documents random MinHash signatures
+spread over --users uploaders, written the way NearDuplicateIndex.add
+writes them but in bulk. The first
+lookup loads the band keys into memory and is timed on its own. Then
+--queries lookups are timed: half are near-copies of stored documents (a
+few signature positions changed, as a new header would), half match
+nothing. Each is made as the owner of the document it copies (or a random
+user). Each lookup includes the refresh query for rows added by other
+processes and the signature comparison, as in the server. Last, one merge
+of MERGE_EVERY new documents into the sorted arrays is timed.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import database
+import near_duplicates
+from benchmarks.report import metadata, percentile, write_report
+from near_duplicates import np
+
+BATCH = 50000
+
+
+def random_signatures(rng, count, num_perm):
+    return rng.integers(0, 2 ** 32, size=(count, num_perm), dtype=np.uint64).astype(np.uint32)
+
+
+def insert(conn, index, names, owners, signatures):
+    keys = near_duplicates.band_keys(signatures, index.bands, index.rows, owners)
+    conn.executemany('''INSERT INTO document_signatures (digest, user_id, signature, layout, bands)
+                        VALUES (?, ?, ?, ?, ?)''',
+                     ((names[i], int(owners[i]), signatures[i].astype('<u4').tobytes(), index.layout,
+                       keys[i].astype('<u8').tobytes()) for i in range(len(signatures))))
+
+
+def fill(db, index, rng, documents, users):
+    """Write documents random signatures and return (signatures, owners) of a sample for queries"""
+    sample, sample_owners = [], []
+    with db.connection() as conn:
+        for start in range(0, documents, BATCH):
+            count = min(BATCH, documents - start)
+            signatures = random_signatures(rng, count, index.num_perm)
+            owners = rng.integers(1, users + 1, size=count)
+            insert(conn, index, [f'doc-{start + i}' for i in range(count)], owners, signatures)
+            picked = rng.integers(0, count, size=max(1, count // 100))
+            sample.append(signatures[picked])
+            sample_owners.append(owners[picked])
+    return np.concatenate(sample), np.concatenate(sample_owners)
+
+
+def near_copy(rng, signature, changed):
+    copy = signature.copy()
+    positions = rng.choice(len(copy), size=changed, replace=False)
+    copy[positions] = rng.integers(0, 2 ** 32, size=changed, dtype=np.uint64).astype(np.uint32)
+    return copy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--threshold', type=float, default=0.9)
+    parser.add_argument('--changed', type=int, default=4,
+                        help='signature positions changed in each near-copy query')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    if not near_duplicates.available():
+        raise SystemExit('numpy is not installed')
+    workdir = tempfile.TemporaryDirectory()
+    db = database.Database(os.path.join(workdir.name, 'bench.db'))
+    db.migrate()
+    index = near_duplicates.NearDuplicateIndex(db, threshold=args.threshold)
+    rng = np.random.default_rng(args.seed)
+
+    started = time.perf_counter()
+    sample, sample_owners = fill(db, index, rng, args.documents, args.users)
+    fill_s = time.perf_counter() - started
+    print(f"wrote {args.documents} signatures in {fill_s:.1f}s", file=sys.stderr)
+
+    started = time.perf_counter()
+    index.find(random_signatures(rng, 1, index.num_perm)[0], 1)
+    load_s = time.perf_counter() - started
+
+    queries = []
+    for i in range(args.queries):
+        if i % 2:
+            j = rng.integers(len(sample))
+            queries.append((True, near_copy(rng, sample[j], args.changed), int(sample_owners[j])))
+        else:
+            queries.append((False, random_signatures(rng, 1, index.num_perm)[0], int(rng.integers(1, args.users + 1))))
+    timings = {True: [], False: []}
+    found = 0
+    for is_copy, signature, user_id in queries:
+        started = time.perf_counter()
+        matches = index.find(signature, user_id)
+        timings[is_copy].append(time.perf_counter() - started)
+        found += is_copy and bool(matches)
+
+    # One merge: MERGE_EVERY more documents, then the lookup that picks them up
+    with db.connection() as conn:
+        signatures = random_signatures(rng, near_duplicates.MERGE_EVERY, index.num_perm)
+        owners = rng.integers(1, args.users + 1, size=len(signatures))
+        insert(conn, index, [f'new-{i}' for i in range(len(signatures))], owners, signatures)
+    started = time.perf_counter()
+    index.find(signatures[0], int(owners[0]))
+    merge_s = time.perf_counter() - started
+
+    results = []
+    for is_copy in (True, False):
+        latencies = sorted(timings[is_copy])
+        results.append({
+            'queries': 'near_copy' if is_copy else 'unrelated',
+            'count': len(latencies),
+            'mean_ms': sum(latencies) / len(latencies) * 1000,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'max_ms': latencies[-1] * 1000,
+        })
+        print(f"{results[-1]['queries']}: p50 {results[-1]['p50_ms']:.3f} ms, "
+              f"p99 {results[-1]['p99_ms']:.3f} ms", file=sys.stderr)
+    stats = index.stats()
+    print(f"first lookup (load) {load_s:.2f}s, merge of {near_duplicates.MERGE_EVERY} {merge_s * 1000:.0f} ms, "
+          f"{found}/{len(timings[True])} near copies found, index {stats['index_bytes'] / 2 ** 20:.0f} MiB",
+          file=sys.stderr)
+
+    write_report({
+        'meta': metadata(kind='near_duplicates', documents=args.documents, users=args.users, threshold=args.threshold,
+                         bands=index.bands, rows=index.rows, changed=args.changed, seed=args.seed),
+        'fill_s': fill_s,
+        'load_s': load_s,
+        'merge_s': merge_s,
+        'index_bytes': stats['index_bytes'],
+        'near_copies_found': found,
+        'results': results
+    }, args.output)
+    workdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark the text pipeline function by function
+
+    python -m benchmarks.bench_pipeline --sizes 1KB 64KB 1MB 16MB --output before.json
+
+Every (function, corpus) case runs in a fresh spawned process, so peak
+RSS belongs to that case alone. Wall time is measured without tracing;
+allocations are measured in a separate traced run. The functions after
+'analyze' are handed an already analysed document, so they time only
+their own work.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.corpus import SIZES, load_corpora
+from benchmarks.report import metadata, write_report
+
+FUNCTIONS = ('extract_text_from_file', 'analyze', 'summarize_text', 'extract_keywords', 'generate_quiz')
+
+
+def _max_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _make_call(pipeline, function, path, engine):
+    from extractors import extract_text_from_file
+    if function == 'extract_text_from_file':
+        return lambda: extract_text_from_file(path)
+
+    text = extract_text_from_file(path)
+    if function == 'analyze':
+        return lambda: pipeline.DocumentAnalysis(text)
+
+    doc = pipeline.DocumentAnalysis(text)
+    if function == 'summarize_text':
+        return lambda: pipeline.summarize_text(doc, 5, engine)
+    if function == 'extract_keywords':
+        return lambda: pipeline.extract_keywords(doc, 10)
+    if function == 'generate_quiz':
+        return lambda: pipeline.generate_quiz(doc, 5)
+    raise ValueError(f'Unknown function {function}')
+
+
+def _run_case(function, path, repeats, engine, results):
+    import engine as pipeline
+    pipeline.warm_nltk()
+
+    call = _make_call(pipeline, function, path, engine)
+    rss_before = _max_rss_bytes()
+
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    peak_rss = _max_rss_bytes()
+
+    tracemalloc.start()
+    call()
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+
+    results.put({
+        'wall_s': {
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'mean': statistics.fmean(timings),
+            'repeats': repeats
+        },
+        'peak_rss_bytes': peak_rss,
+        'rss_growth_bytes': max(peak_rss - rss_before, 0),
+        'alloc_peak_bytes': alloc_peak,
+        'live_blocks_after': blocks
+    })
+
+
+def run(functions, corpora, repeats, engine):
+    context = multiprocessing.get_context('spawn')
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for corpus_name, text in corpora.items():
+            path = os.path.join(tmp, f'{corpus_name}.txt')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            for function in functions:
+                queue = context.Queue()
+                process = context.Process(target=_run_case, args=(function, path, repeats, engine, queue))
+                process.start()
+                case = queue.get()
+                process.join()
+                case.update(function=function, corpus=corpus_name, bytes=len(text.encode('utf-8')))
+                if function == 'summarize_text':
+                    case['engine'] = engine
+                results.append(case)
+                print(f"{function:24} {corpus_name:22} median {case['wall_s']['median'] * 1000:10.2f} ms  "
+                      f"peak RSS {case['peak_rss_bytes'] / 2**20:8.1f} MiB  "
+                      f"alloc peak {case['alloc_peak_bytes'] / 2**20:8.1f} MiB", file=sys.stderr)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='*', default=list(SIZES), choices=list(SIZES),
+                        help='synthetic corpus sizes to generate')
+    parser.add_argument('--fixtures', help='directory of extra text files to benchmark')
+    parser.add_argument('--functions', nargs='*', default=list(FUNCTIONS), choices=FUNCTIONS)
+    parser.add_argument('--engine', default='frequency', help='summary engine for summarize_text')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    corpora = load_corpora(args.sizes, args.fixtures, seed=args.seed)
+    results = run(args.functions, corpora, args.repeats, args.engine)
+    write_report({'meta': metadata(kind='pipeline', seed=args.seed), 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Compare two benchmark reports written by bench_pipeline or load_test
+
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import json
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _change(before, after):
+    if not before or after is None:
+        return '      n/a'
+    return f'{(after - before) / before * 100:+8.1f}%'
+
+
+def compare_pipeline(before, after):
+    previous = {(case['function'], case['corpus']): case for case in before}
+    for case in after:
+        old = previous.get((case['function'], case['corpus']))
+        if old is None:
+            continue
+        print(f"{case['function']:24} {case['corpus']:22} "
+              f"median {old['wall_s']['median'] * 1000:10.2f} -> {case['wall_s']['median'] * 1000:10.2f} ms "
+              f"{_change(old['wall_s']['median'], case['wall_s']['median'])}  "
+              f"alloc peak {_change(old['alloc_peak_bytes'], case['alloc_peak_bytes'])}")
+
+
+def compare_load(before, after):
+    rows = [('overall', before['overall'], after['overall'])]
+    rows += [(name, before['endpoints'][name], stats)
+             for name, stats in after['endpoints'].items() if name in before['endpoints']]
+    for name, old, new in rows:
+        print(f"{name:18} rps {old['throughput_rps']:8.1f} -> {new['throughput_rps']:8.1f} "
+              f"{_change(old['throughput_rps'], new['throughput_rps'])}  "
+              f"p95 {_change(old['p95_s'], new['p95_s'])}  p99 {_change(old['p99_s'], new['p99_s'])}  "
+              f"errors {old['errors']} -> {new['errors']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    args = parser.parse_args(argv)
+
+    before, after = _load(args.before), _load(args.after)
+    kind = after['meta'].get('kind')
+    if before['meta'].get('kind') != kind:
+        parser.error('Reports are of different kinds')
+    print(f"{(before['meta'].get('commit') or '')[:10]} -> {(after['meta'].get('commit') or '')[:10]}")
+    if kind == 'load':
+        compare_load(before['results'], after['results'])
+    else:
+        compare_pipeline(before['results'], after['results'])
+
+
+if __name__ == '__main__':
+    main()
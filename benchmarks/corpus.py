@@ -0,0 +1,102 @@
+import itertools
+import os
+import random
+
+SIZES = {
+    '1KB': 1024,
+    '64KB': 64 * 1024,
+    '1MB': 1024 * 1024,
+    '16MB': 16 * 1024 * 1024,
+}
+
+_FUNCTION_WORDS = ('the', 'of', 'and', 'a', 'to', 'in', 'is', 'that', 'for', 'it', 'as', 'with',
+                   'was', 'on', 'are', 'by', 'this', 'be', 'from', 'or', 'which', 'an', 'at')
+
+
+def _vocabulary(rng, size=6000):
+    letters = 'abcdefghijklmnoprstuvwy'
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(letters) for _ in range(rng.randint(4, 11))))
+    return sorted(words)
+
+
+def synthetic_text(num_bytes, seed=0):
+    """Deterministic lecture-like text of about num_bytes bytes
+
+    Content words follow a Zipf-like distribution and are mixed with
+    stopwords, sentences vary in length and paragraphs are separated by
+    blank lines, so tokenization and scoring see realistic shapes.
+    """
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng)
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(vocabulary))))
+    paragraphs = []
+    size = 0
+    while size < num_bytes:
+        sentences = []
+        for _ in range(rng.randint(3, 8)):
+            length = rng.randint(6, 28)
+            content = rng.choices(vocabulary, cum_weights=cum_weights, k=length)
+            words = [w if rng.random() < 0.6 else f'{rng.choice(_FUNCTION_WORDS)} {w}' for w in content]
+            sentence = ' '.join(words)
+            if rng.random() < 0.2:
+                cut = rng.randint(1, len(words) - 1)
+                sentence = ' '.join(words[:cut]) + ', ' + ' '.join(words[cut:])
+            sentences.append(sentence[0].upper() + sentence[1:] + rng.choice('...?!'))
+        paragraph = ' '.join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return '\n\n'.join(paragraphs)[:num_bytes]
+
+
+def synthetic_pdf(num_pages, seed=0, lines_per_page=48, line_chars=90):
+    """A PDF of num_pages pages of synthetic_text, written without any PDF library"""
+    words = synthetic_text(num_pages * lines_per_page * line_chars, seed=seed).split()
+    lines, line = [], ''
+    for word in words:
+        if len(line) + len(word) >= line_chars:
+            lines.append(line)
+            line = ''
+        line = f'{line} {word}' if line else word
+    lines.append(line)
+
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None,
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_ids = []
+    for page in range(num_pages):
+        text = lines[page * lines_per_page:(page + 1) * lines_per_page]
+        escaped = (l.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') for l in text)
+        content = 'BT /F1 9 Tf 11 TL 36 760 Td ' + ' '.join(f'({l}) Tj T*' for l in escaped) + ' ET'
+        stream = content.encode('latin-1', 'replace')
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % len(objects))
+        page_ids.append(len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        ' '.join(f'{i} 0 R' for i in page_ids).encode(), num_pages)
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def load_corpora(sizes=None, fixtures_dir=None, seed=0):
+    """Return {name: text} for the requested synthetic sizes plus any fixture files"""
+    corpora = {}
+    for name in sizes or SIZES:
+        corpora[f'synthetic-{name}'] = synthetic_text(SIZES[name], seed=seed)
+    if fixtures_dir:
+        for filename in sorted(os.listdir(fixtures_dir)):
+            path = os.path.join(fixtures_dir, filename)
+            if os.path.isfile(path):
+                with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                    corpora[f'fixture-{filename}'] = f.read()
+    return corpora
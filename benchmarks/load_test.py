@@ -0,0 +1,211 @@
+"""Local load generator for /process, /my-summaries and /save-quiz-result
+
+    python -m benchmarks.load_test --workers 8 --duration 30 --output load.json
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 --workers 16
+
+Without --url the app runs in-process through the Flask test client,
+against a throwaway database in a temporary directory.
+"""
+import argparse
+import http.cookiejar
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+from benchmarks.corpus import synthetic_text
+from benchmarks.report import metadata, percentile, write_report
+
+DEFAULT_MIX = 'process=1,my-summaries=5,save-quiz-result=3'
+
+
+class FlaskClientSession:
+    """One logged-in user talking to the in-process app"""
+
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def get(self, path):
+        return self.client.get(path).status_code, None
+
+    def post_json(self, path, payload):
+        response = self.client.post(path, json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+    def post_file(self, path, filename, data, fields):
+        response = self.client.post(path, data={'file': (data, filename), **fields})
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpSession:
+    """One logged-in user talking to a running server"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def _send(self, request):
+        try:
+            with self.opener.open(request, timeout=300) as response:
+                body = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            body, status = e.read(), e.code
+        try:
+            return status, json.loads(body)
+        except ValueError:
+            return status, None
+
+    def get(self, path):
+        return self._send(urllib.request.Request(self.base_url + path))
+
+    def post_json(self, path, payload):
+        return self._send(urllib.request.Request(self.base_url + path, data=json.dumps(payload).encode(),
+                                                 headers={'Content-Type': 'application/json'}))
+
+    def post_file(self, path, filename, data, fields):
+        boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in fields.items():
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                     f'Content-Type: text/plain\r\n\r\n'.encode() + data.getvalue() + b'\r\n')
+        parts.append(f'--{boundary}--\r\n'.encode())
+        return self._send(urllib.request.Request(
+            self.base_url + path, data=b''.join(parts),
+            headers={'Content-Type': f'multipart/form-data; boundary={boundary}'}))
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, weight = item.split('=')
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def run_worker(index, make_session, args, mix, deadline, samples, lock):
+    rng = random.Random(args.seed + index)
+    session = make_session()
+    username = f'bench_{uuid.uuid4().hex[:10]}'
+    session.post_json('/register', {'username': username, 'email': f'{username}@example.com',
+                                    'password': 'benchmark'})
+    session.post_json('/login', {'username': username, 'password': 'benchmark'})
+
+    shared_upload = synthetic_text(args.upload_size, seed=args.seed).encode('utf-8')
+    names, weights = list(mix), list(mix.values())
+    summary_id, quiz, token = None, [], None
+    sent = 0
+    while time.monotonic() < deadline and (args.requests is None or sent < args.requests):
+        endpoint = rng.choices(names, weights=weights)[0]
+        started = time.perf_counter()
+        if endpoint == 'process':
+            data = (synthetic_text(args.upload_size, seed=rng.randrange(1 << 30)).encode('utf-8')
+                    if args.unique_uploads else shared_upload)
+            status, body = session.post_file('/process', 'bench.txt', io.BytesIO(data),
+                                             {'summary_length': 5, 'quiz_questions': 5})
+            if body and body.get('summary_id'):
+                summary_id, quiz, token = body['summary_id'], body['quiz'], body.get('quiz_token')
+        elif endpoint == 'my-summaries':
+            status, _ = session.get('/my-summaries')
+        elif endpoint == 'save-quiz-result':
+            if quiz:
+                answers = {str(question['id']): rng.choice(question['options']) for question in quiz}
+                payload = {'summary_id': summary_id, 'answers': answers, 'quiz_token': token}
+            else:
+                payload = {'summary_id': None, 'score': rng.randint(0, 5), 'total_questions': 5}
+            status, _ = session.post_json('/save-quiz-result', payload)
+        else:
+            raise ValueError(f'Unknown endpoint {endpoint}')
+        elapsed = time.perf_counter() - started
+        sent += 1
+        with lock:
+            samples.append((endpoint, elapsed, status < 400))
+
+
+def summarize(samples, elapsed):
+    by_endpoint = {}
+    for endpoint, latency, ok in samples:
+        by_endpoint.setdefault(endpoint, []).append((latency, ok))
+
+    def stats(entries):
+        latencies = sorted(latency for latency, _ in entries)
+        return {
+            'requests': len(entries),
+            'errors': sum(1 for _, ok in entries if not ok),
+            'throughput_rps': len(entries) / elapsed if elapsed else None,
+            'mean_s': sum(latencies) / len(latencies) if latencies else None,
+            'p50_s': percentile(latencies, 50),
+            'p95_s': percentile(latencies, 95),
+            'p99_s': percentile(latencies, 99),
+        }
+
+    return {
+        'elapsed_s': elapsed,
+        'overall': stats([(latency, ok) for _, latency, ok in samples]),
+        'endpoints': {endpoint: stats(entries) for endpoint, entries in sorted(by_endpoint.items())}
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='base URL of a running server; default is the in-process test client')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds to run')
+    parser.add_argument('--requests', type=int, help='stop each worker after this many requests')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='endpoint weights, e.g. ' + DEFAULT_MIX)
+    parser.add_argument('--upload-size', type=int, default=64 * 1024, help='bytes per /process upload')
+    parser.add_argument('--unique-uploads', action='store_true',
+                        help='send a different document every time instead of repeating one')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+    mix = parse_mix(args.mix)
+
+    workdir = app = None
+    if args.url:
+        make_session = lambda: HttpSession(args.url)
+    else:
+        workdir = tempfile.TemporaryDirectory()
+        os.chdir(workdir.name)
+        import app
+        flask_app = app.create_app()
+        make_session = lambda: FlaskClientSession(flask_app)
+
+    samples, lock = [], threading.Lock()
+    started = time.monotonic()
+    deadline = started + args.duration
+    threads = [threading.Thread(target=run_worker, args=(i, make_session, args, mix, deadline, samples, lock))
+               for i in range(args.workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    report = summarize(samples, elapsed)
+    overall = report['overall']
+    print(f"{overall['requests']} requests in {elapsed:.1f}s, {overall['throughput_rps']:.1f} req/s, "
+          f"p50 {overall['p50_s'] * 1000:.1f} ms, p99 {overall['p99_s'] * 1000:.1f} ms", file=sys.stderr)
+    write_report({
+        'meta': metadata(kind='load', target=args.url or 'test-client', workers=args.workers, mix=mix,
+                         upload_size=args.upload_size, unique_uploads=args.unique_uploads, seed=args.seed),
+        'results': report
+    }, args.output)
+
+    if workdir is not None:
+        app.job_manager.shutdown()
+        os.chdir(os.path.dirname(workdir.name))
+        workdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+import os
+import threading
+import time
+import traceback
+from collections import Counter
+from itertools import combinations
+
+# numpy is optional; without it quiz distractors come from the document's keywords only
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# A document adds sentence co-occurrences among its most frequent terms only
+DOCUMENT_TERMS = 200
+# Counts kept per term, the largest first; smaller ones are dropped at each merge
+KEEP_PER_TERM = 64
+# Distractor candidates precomputed per term
+NEIGHBORS = 16
+# Documents counted in a process before they are merged into the shared snapshot,
+# or fewer once the oldest has waited MERGE_INTERVAL_S
+MERGE_EVERY = 64
+MERGE_INTERVAL_S = 120
+# How often a process looks for a snapshot merged by another one
+RELOAD_INTERVAL_S = 60
+
+
+def available():
+    """Whether co-occurrence distractors can be used"""
+    return np is not None
+
+
+class PairCounter:
+    """Count, per sentence, which of a fixed set of terms appear together"""
+
+    def __init__(self, terms):
+        self.terms = list(terms)
+        self.ids = {term: i for i, term in enumerate(self.terms)}
+        self.sentences = Counter()
+        self.pairs = Counter()
+
+    def add(self, words):
+        ids = sorted({self.ids[word] for word in words if word in self.ids})
+        self.sentences.update(ids)
+        if len(ids) > 1:
+            self.pairs.update(combinations(ids, 2))
+
+    def matrix(self):
+        term_counts = np.zeros(len(self.terms), dtype=np.float64)
+        if self.sentences:
+            term_counts[list(self.sentences)] = list(self.sentences.values())
+        pairs = np.array(list(self.pairs), dtype=np.int64).reshape(-1, 2)
+        counts = np.fromiter(self.pairs.values(), dtype=np.float64, count=len(self.pairs))
+        # Stored in both directions, so each term's row lists all its partners
+        return CooccurrenceMatrix.from_pairs(self.terms, term_counts,
+                                             np.concatenate((pairs[:, 0], pairs[:, 1])),
+                                             np.concatenate((pairs[:, 1], pairs[:, 0])),
+                                             np.concatenate((counts, counts)))
+
+
+class CooccurrenceMatrix:
+    """Sentence co-occurrence counts of terms, as CSR arrays
+
+    term_counts[i] is the number of sentences containing term i, and row i
+    of (indptr, indices, counts) the number sharing a sentence with each
+    other term. neighbors[i] holds the NEIGHBORS terms most associated with
+    term i by the Ochiai coefficient, count / sqrt(count_i * count_j), so a
+    lookup never scans a row.
+    """
+
+    def __init__(self, terms, term_counts, indptr, indices, counts):
+        self.terms = terms
+        self.ids = {term: i for i, term in enumerate(terms)}
+        self.term_counts = term_counts
+        self.indptr = indptr
+        self.indices = indices
+        self.counts = counts
+        self.neighbors, self.scores = self._rank_neighbors()
+
+    @classmethod
+    def empty(cls):
+        return cls([], np.zeros(0, dtype=np.float64), np.zeros(1, dtype=np.int64),
+                   np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+
+    @classmethod
+    def from_pairs(cls, terms, term_counts, rows, cols, counts, keep=KEEP_PER_TERM):
+        """Build from coordinate arrays without duplicates, keeping the largest keep counts per row"""
+        order = np.lexsort((-counts, rows))
+        rows, cols, counts = rows[order], cols[order], counts[order]
+        starts = np.searchsorted(rows, np.arange(len(terms)))
+        kept = np.arange(len(rows)) - starts[rows] < keep
+        rows, cols, counts = rows[kept], cols[kept], counts[kept]
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(terms)), out=indptr[1:])
+        return cls(terms, term_counts, indptr, cols.astype(np.int32), counts.astype(np.float32))
+
+    def _rank_neighbors(self):
+        size = len(self.terms)
+        neighbors = np.full((size, NEIGHBORS), -1, dtype=np.int32)
+        scores = np.zeros((size, NEIGHBORS), dtype=np.float32)
+        if not len(self.indices):
+            return neighbors, scores
+        rows = np.repeat(np.arange(size), np.diff(self.indptr))
+        score = self.counts / np.sqrt(self.term_counts[rows] * self.term_counts[self.indices])
+        order = np.lexsort((-score, rows))
+        rank = np.arange(len(order)) - self.indptr[rows]
+        top = rank < NEIGHBORS
+        neighbors[rows[top], rank[top]] = self.indices[order][top]
+        scores[rows[top], rank[top]] = score[order][top]
+        return neighbors, scores
+
+    def related(self, term):
+        """(term, score) of the terms most associated with term, strongest first"""
+        i = self.ids.get(term)
+        if i is None:
+            return []
+        row = self.neighbors[i]
+        return [(self.terms[j], score) for j, score in zip(row[row >= 0].tolist(), self.scores[i].tolist())]
+
+    def merged(self, others):
+        """A new matrix with the counts of other matrices added to these"""
+        ids = dict(self.ids)
+        parts = [(np.repeat(np.arange(len(self.terms)), np.diff(self.indptr)), self.indices, self.counts)]
+        mappings = []
+        for other in others:
+            # New terms are numbered after the existing ones
+            mapping = np.fromiter((ids.setdefault(term, len(ids)) for term in other.terms), dtype=np.int64,
+                                  count=len(other.terms))
+            mappings.append(mapping)
+            parts.append((mapping[np.repeat(np.arange(len(other.terms)), np.diff(other.indptr))],
+                          mapping[other.indices], other.counts))
+        terms = list(ids)
+        size = len(terms)
+        term_counts = np.zeros(size, dtype=np.float64)
+        term_counts[:len(self.terms)] = self.term_counts
+        for other, mapping in zip(others, mappings):
+            np.add.at(term_counts, mapping, other.term_counts)
+        rows = np.concatenate([part[0] for part in parts]).astype(np.int64)
+        cols = np.concatenate([part[1] for part in parts]).astype(np.int64)
+        counts = np.concatenate([part[2] for part in parts]).astype(np.float64)
+        keys, inverse = np.unique(rows * size + cols, return_inverse=True)
+        return CooccurrenceMatrix.from_pairs(terms, term_counts, keys // size, keys % size,
+                                             np.bincount(inverse.ravel(), weights=counts))
+
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.term_counts, self.indptr, self.indices, self.counts,
+                                      self.neighbors, self.scores))
+
+
+class CooccurrenceIndex:
+    """Corpus-wide co-occurrence counts, grown by every document quizzed
+
+    Each document's counts wait in the process that analyzed it until
+    MERGE_EVERY have gathered, then are merged into the single snapshot
+    row of the cooccurrence_snapshot table, so every web and job process
+    builds on the same corpus. Without a database the index lives in
+    memory only. Loading and merging the snapshot happen on a background
+    thread, started in each process on its first document; lookups read
+    the in-memory matrix and never wait for either.
+    """
+
+    def __init__(self, db=None):
+        self.db = db
+        self.matrix = None
+        self.version = 0
+        self.documents = 0
+        self._pending = []
+        self._pending_since = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker_pid = None
+        self.merges = 0
+        self.merge_seconds = 0.0
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # Documents queued before the fork are the parent's to merge, and a
+        # lock held by its merge thread would never be released here
+        self._pending, self._pending_since = [], None
+        self._lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def related(self, term, document=None):
+        """Terms sharing sentences with term in the document and across the corpus, strongest first"""
+        scores = {}
+        for matrix in (document, self.matrix):
+            if matrix is not None:
+                for other, score in matrix.related(term):
+                    scores[other] = scores.get(other, 0.0) + score
+        return sorted(scores, key=scores.get, reverse=True)
+
+    def add_document(self, document):
+        """Queue one document's counts for the background merge"""
+        with self._lock:
+            self._pending.append(document)
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            full = len(self._pending) >= MERGE_EVERY
+            # A forked process does not inherit its parent's thread
+            start = self._worker_pid != os.getpid()
+            self._worker_pid = os.getpid()
+        if start:
+            threading.Thread(target=self._run, name='cooccurrence-merge', daemon=True).start()
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        """Reload and merge whenever either is due, until the process exits
+
+        Errors are reported rather than raised, so one failed merge never
+        stops later ones; quizzes are made from whatever the index holds.
+        """
+        while True:
+            self._wake.wait(self._seconds_until_due())
+            self._wake.clear()
+            try:
+                if self.matrix is None or time.monotonic() - self._checked_at >= RELOAD_INTERVAL_S:
+                    self.reload()
+                if self._merge_due():
+                    self.merge()
+            except Exception as e:
+                print(f"Co-occurrence merge error: {e}")
+                print(traceback.format_exc())
+                # Do not retry in a tight loop
+                self._checked_at = time.monotonic()
+                time.sleep(1)
+
+    def _merge_due(self):
+        with self._lock:
+            return bool(self._pending) and (len(self._pending) >= MERGE_EVERY
+                                            or time.monotonic() - self._pending_since >= MERGE_INTERVAL_S)
+
+    def _seconds_until_due(self):
+        due = self._checked_at + RELOAD_INTERVAL_S
+        with self._lock:
+            if self._pending_since is not None:
+                due = min(due, self._pending_since + MERGE_INTERVAL_S)
+        return max(due - time.monotonic(), 0)
+
+    def reload(self):
+        """Load the shared snapshot if another process has merged since we last did"""
+        self._checked_at = time.monotonic()
+        if self.db is None:
+            if self.matrix is None:
+                self.matrix = CooccurrenceMatrix.empty()
+            return
+        with self.db.connection() as conn:
+            row = conn.execute('SELECT version FROM cooccurrence_snapshot WHERE id = 1').fetchone()
+            if row is None:
+                if self.matrix is None:
+                    self.matrix = CooccurrenceMatrix.empty()
+                return
+            if row[0] != self.version or self.matrix is None:
+                self._load(conn)
+
+    def merge(self):
+        """Merge the queued documents into the snapshot; skipped while another thread merges"""
+        if not self._merge_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                pending, self._pending, self._pending_since = self._pending, [], None
+            if not pending:
+                return
+            started = time.perf_counter()
+            if self.db is None:
+                self.matrix = (self.matrix or CooccurrenceMatrix.empty()).merged(pending)
+                self.version += 1
+                self.documents += len(pending)
+            else:
+                with self.db.connection() as conn:
+                    # Merges from every process are serialized, so none is lost
+                    conn.execute('BEGIN IMMEDIATE')
+                    row = conn.execute('SELECT version FROM cooccurrence_snapshot WHERE id = 1').fetchone()
+                    if row is not None and (row[0] != self.version or self.matrix is None):
+                        self._load(conn)
+                    elif self.matrix is None:
+                        self.matrix = CooccurrenceMatrix.empty()
+                    matrix = self.matrix.merged(pending)
+                    version, documents = self.version + 1, self.documents + len(pending)
+                    conn.execute('''INSERT OR REPLACE INTO cooccurrence_snapshot
+                                    (id, version, documents, terms, term_counts, indptr, indices, counts, updated_at)
+                                    VALUES (1, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)''',
+                                 (version, documents, '\n'.join(matrix.terms), matrix.term_counts.tobytes(),
+                                  matrix.indptr.tobytes(), matrix.indices.tobytes(), matrix.counts.tobytes()))
+                self.matrix, self.version, self.documents = matrix, version, documents
+            self.merges += 1
+            self.merge_seconds += time.perf_counter() - started
+        finally:
+            self._merge_lock.release()
+
+    def _load(self, conn):
+        row = conn.execute('''SELECT version, documents, terms, term_counts, indptr, indices, counts
+                              FROM cooccurrence_snapshot WHERE id = 1''').fetchone()
+        terms = row['terms'].split('\n') if row['terms'] else []
+        self.matrix = CooccurrenceMatrix(terms, np.frombuffer(row['term_counts'], dtype=np.float64),
+                                         np.frombuffer(row['indptr'], dtype=np.int64),
+                                         np.frombuffer(row['indices'], dtype=np.int32),
+                                         np.frombuffer(row['counts'], dtype=np.float32))
+        self.version, self.documents = row['version'], row['documents']
+
+    def stats(self):
+        matrix = self.matrix
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'enabled': available(),
+            'version': self.version,
+            'documents': self.documents,
+            'pending_documents': pending,
+            'terms': len(matrix.terms) if matrix is not None else 0,
+            'pairs': len(matrix.indices) if matrix is not None else 0,
+            'bytes': matrix.nbytes() if matrix is not None else 0,
+            'merges': self.merges,
+            'mean_merge_ms': round(self.merge_seconds / self.merges * 1000, 2) if self.merges else 0.0
+        }
+
+
+cooccurrence_index = CooccurrenceIndex()
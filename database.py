@@ -0,0 +1,510 @@
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Applied to every new connection. WAL lets readers run alongside a writer;
+# journal_mode is persistent, the rest are per connection.
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA mmap_size = 134217728',
+)
+
+RECENT_SCORES = 10
+
+
+def _percentage(score, total):
+    """SQL for a quiz score as a percentage; a quiz with no questions scores 0"""
+    return f'CASE WHEN {total} > 0 THEN {score} * 100.0 / {total} ELSE 0 END'
+
+
+def _recent_scores(user_id):
+    """SQL for a user's newest quiz results as a JSON list of [score, total_questions], newest first"""
+    return f'''(SELECT json_group_array(json_array(score, total_questions))
+               FROM (SELECT score, total_questions FROM quiz_results WHERE user_id = {user_id}
+                     ORDER BY created_at DESC, id DESC LIMIT {RECENT_SCORES}))'''
+
+
+PERCENTAGE = _percentage('score', 'total_questions')
+
+# Recompute user_stats and summary_quiz_stats from summaries and quiz_results;
+# migration 6 runs these once to fill the new tables
+REBUILD_STATS = (
+    'DELETE FROM user_stats',
+    'DELETE FROM summary_quiz_stats',
+    f'''INSERT INTO user_stats
+          (user_id, summaries, characters, last_summary_at,
+           quizzes, questions, correct, best_percentage, last_quiz_at, recent_scores)
+          SELECT u.id, coalesce(s.n, 0), coalesce(s.characters, 0), s.last_at,
+                 coalesce(q.n, 0), coalesce(q.questions, 0), coalesce(q.correct, 0), q.best, q.last_at,
+                 {_recent_scores('u.id')}
+          FROM users u
+          LEFT JOIN (SELECT user_id, count(*) AS n, sum(original_length) AS characters,
+                            max(created_at) AS last_at
+                     FROM summaries GROUP BY user_id) s ON s.user_id = u.id
+          LEFT JOIN (SELECT user_id, count(*) AS n, sum(total_questions) AS questions, sum(score) AS correct,
+                            max({PERCENTAGE}) AS best, max(created_at) AS last_at
+                     FROM quiz_results GROUP BY user_id) q ON q.user_id = u.id
+          WHERE s.n IS NOT NULL OR q.n IS NOT NULL''',
+    f'''INSERT INTO summary_quiz_stats
+          (summary_id, user_id, attempts, questions, correct, best_percentage, last_percentage, last_attempt_at)
+          SELECT s.id, s.user_id, count(*), sum(q.total_questions), sum(q.score), max({PERCENTAGE}),
+                 (SELECT {PERCENTAGE} FROM quiz_results WHERE summary_id = s.id AND user_id = s.user_id
+                  ORDER BY created_at DESC, id DESC LIMIT 1),
+                 max(q.created_at)
+          FROM summaries s JOIN quiz_results q ON q.summary_id = s.id AND q.user_id = s.user_id
+          GROUP BY s.id''',
+)
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Never edit a released migration; append a new one instead.
+MIGRATIONS = [
+    # 1: the original init_db schema
+    (
+        '''CREATE TABLE IF NOT EXISTS users
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS summaries
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            keywords TEXT NOT NULL,
+            original_length INTEGER,
+            summary_length INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id))''',
+        '''CREATE TABLE IF NOT EXISTS quiz_results
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            summary_id INTEGER,
+            score INTEGER NOT NULL,
+            total_questions INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (summary_id) REFERENCES summaries(id))''',
+    ),
+    # 2: per-user listing indexes for the dashboard
+    (
+        'CREATE INDEX IF NOT EXISTS idx_summaries_user_created ON summaries (user_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_quiz_results_user_created ON quiz_results (user_id, created_at)',
+    ),
+    # 3: result cache and async job tables
+    (
+        '''CREATE TABLE IF NOT EXISTS result_cache
+           (cache_key TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS jobs
+           (id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            status TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            owner_pid INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP)''',
+    ),
+    # 4: full-text search over summaries. The index reads its content from a
+    # view that adds an owner token, so searches are scoped to one user
+    # inside FTS instead of filtering every match afterwards.
+    (
+        '''CREATE VIEW IF NOT EXISTS summaries_search_source AS
+           SELECT id, title, summary, keywords, 'u' || user_id AS owner FROM summaries''',
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS summaries_fts USING fts5
+           (title, summary, keywords, owner,
+            content='summaries_search_source', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2')''',
+        "INSERT INTO summaries_fts (summaries_fts) VALUES ('rebuild')",
+    ),
+    # 5: stored question pools, so quizzes can be retaken and graded on the
+    # server. answer is the index of the correct option.
+    (
+        '''CREATE TABLE IF NOT EXISTS quiz_pool
+           (summary_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            question TEXT NOT NULL,
+            options TEXT NOT NULL,
+            answer INTEGER NOT NULL,
+            PRIMARY KEY (summary_id, position)) WITHOUT ROWID''',
+        'ALTER TABLE summaries ADD COLUMN quiz_pool_size INTEGER NOT NULL DEFAULT 0',
+    ),
+    # 6: dashboard statistics, kept up to date by the functions that write
+    # summaries and quiz results so reading them never scans history.
+    # characters is the total original_length of the user's summaries.
+    (
+        '''CREATE TABLE IF NOT EXISTS user_stats
+           (user_id INTEGER PRIMARY KEY,
+            summaries INTEGER NOT NULL DEFAULT 0,
+            characters INTEGER NOT NULL DEFAULT 0,
+            last_summary_at TIMESTAMP,
+            quizzes INTEGER NOT NULL DEFAULT 0,
+            questions INTEGER NOT NULL DEFAULT 0,
+            correct INTEGER NOT NULL DEFAULT 0,
+            best_percentage REAL,
+            last_quiz_at TIMESTAMP,
+            recent_scores TEXT NOT NULL DEFAULT '[]',
+            FOREIGN KEY (user_id) REFERENCES users(id))''',
+        '''CREATE TABLE IF NOT EXISTS summary_quiz_stats
+           (summary_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            questions INTEGER NOT NULL DEFAULT 0,
+            correct INTEGER NOT NULL DEFAULT 0,
+            best_percentage REAL,
+            last_percentage REAL,
+            last_attempt_at TIMESTAMP,
+            FOREIGN KEY (summary_id) REFERENCES summaries(id))''',
+        *REBUILD_STATS,
+    ),
+    # 7: MinHash signatures of analyzed documents, for reusing results across
+    # near-duplicate uploads. digest is the document's result cache digest;
+    # bands holds its LSH band keys under the layout ('<bands>x<rows>') in use
+    # when it was written.
+    (
+        '''CREATE TABLE IF NOT EXISTS document_signatures
+           (id INTEGER PRIMARY KEY,
+            digest TEXT UNIQUE NOT NULL,
+            signature BLOB NOT NULL,
+            layout TEXT NOT NULL,
+            bands BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    ),
+    # 8: corpus-wide term co-occurrence counts for quiz distractors, one row
+    # holding the CSR arrays as raw numpy buffers. version goes up with every
+    # merge, so processes can tell when their copy is stale.
+    (
+        '''CREATE TABLE IF NOT EXISTS cooccurrence_snapshot
+           (id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            documents INTEGER NOT NULL,
+            terms TEXT NOT NULL,
+            term_counts BLOB NOT NULL,
+            indptr BLOB NOT NULL,
+            indices BLOB NOT NULL,
+            counts BLOB NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    ),
+    # 9: near-duplicate reuse is limited to the uploader's own documents, so
+    # signatures are stored per user and their band keys salted with user_id.
+    # Rows from migration 7 have no known owner and are dropped; documents
+    # are indexed again as they are processed.
+    (
+        'DROP TABLE IF EXISTS document_signatures',
+        '''CREATE TABLE document_signatures
+           (id INTEGER PRIMARY KEY,
+            digest TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            signature BLOB NOT NULL,
+            layout TEXT NOT NULL,
+            bands BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, digest),
+            FOREIGN KEY (user_id) REFERENCES users(id))''',
+    ),
+    # 10: each issued quiz of a summary is graded once. A quiz is its seed
+    # ('' for the one /process returns), so asking again for the same seed,
+    # or replaying its token, cannot score answers already revealed.
+    (
+        '''CREATE TABLE graded_quizzes
+           (summary_id INTEGER NOT NULL,
+            quiz TEXT NOT NULL,
+            graded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (summary_id, quiz),
+            FOREIGN KEY (summary_id) REFERENCES summaries(id))''',
+    ),
+]
+
+
+class Database:
+    """A small pool of tuned SQLite connections
+
+    Connections are reused across requests, so sqlite3's per-connection
+    statement cache keeps every query below prepared after its first use.
+    Pending migrations are applied before the first connection is lent,
+    so the schema is current however the app was started.
+    """
+
+    def __init__(self, path, pool_size=8):
+        self.path = path
+        self.pool_size = pool_size
+        # Called with the seconds each connection was held, if set
+        self.observer = None
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._migrate_lock = threading.Lock()
+        self._migrated = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _reset_after_fork(self):
+        # Connections must never be shared with a forked child, and a
+        # migration the parent was running is not running here
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pool = queue.LifoQueue(maxsize=self.pool_size)
+                self._migrate_lock = threading.Lock()
+                self._pid = os.getpid()
+
+    def connection(self):
+        """Borrow a connection; commits on success and rolls back on error"""
+        if not self._migrated:
+            self.migrate()
+        return self._borrow()
+
+    @contextmanager
+    def _borrow(self):
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+        observer = self.observer
+        started = time.perf_counter() if observer is not None else None
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+            if observer is not None:
+                observer(time.perf_counter() - started)
+
+    def migrate(self):
+        """Apply pending migrations and return the resulting schema version
+
+        Each migration runs in its own write transaction, and the version
+        is read inside it, so processes starting together apply each
+        migration once.
+        """
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+        with self._migrate_lock, self._borrow() as conn:
+            while True:
+                conn.execute('BEGIN IMMEDIATE')
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                if version >= len(MIGRATIONS):
+                    break
+                for statement in MIGRATIONS[version]:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {version + 1}')
+                conn.commit()
+            self._migrated = True
+            return len(MIGRATIONS)
+
+
+def find_user(conn, username):
+    return conn.execute('SELECT id, username, password FROM users WHERE username = ?',
+                        (username,)).fetchone()
+
+
+def create_user(conn, username, email, password_hash):
+    conn.execute('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                 (username, email, password_hash))
+
+
+def update_password(conn, user_id, password_hash):
+    conn.execute('UPDATE users SET password = ? WHERE id = ?', (password_hash, user_id))
+
+
+def insert_summary(conn, user_id, title, summary, keywords_json, original_length, summary_length):
+    cursor = conn.execute('''INSERT INTO summaries
+                             (user_id, title, summary, keywords, original_length, summary_length)
+                             VALUES (?, ?, ?, ?, ?, ?)''',
+                          (user_id, title, summary, keywords_json, original_length, summary_length))
+    summary_id = cursor.lastrowid
+    conn.execute('''INSERT INTO summaries_fts (rowid, title, summary, keywords, owner)
+                    VALUES (?, ?, ?, ?, ?)''', (summary_id, title, summary, keywords_json, f'u{user_id}'))
+    conn.execute('''INSERT INTO user_stats (user_id, summaries, characters, last_summary_at)
+                    VALUES (?, 1, coalesce(?, 0), CURRENT_TIMESTAMP)
+                    ON CONFLICT (user_id) DO UPDATE SET summaries = summaries + 1,
+                        characters = characters + excluded.characters,
+                        last_summary_at = excluded.last_summary_at''', (user_id, original_length))
+    return summary_id
+
+
+def list_summaries(conn, user_id, limit, before=None):
+    """One page of a user's summaries without their bodies, newest first
+
+    before is the (created_at, id) of the last row of the previous page.
+    """
+    if before is None:
+        return conn.execute('''SELECT id, title, keywords, original_length, summary_length, created_at
+                               FROM summaries WHERE user_id = ?
+                               ORDER BY created_at DESC, id DESC LIMIT ?''', (user_id, limit)).fetchall()
+    return conn.execute('''SELECT id, title, keywords, original_length, summary_length, created_at
+                           FROM summaries WHERE user_id = ? AND (created_at, id) < (?, ?)
+                           ORDER BY created_at DESC, id DESC LIMIT ?''', (user_id, *before, limit)).fetchall()
+
+
+def get_summary(conn, summary_id, user_id):
+    return conn.execute('''SELECT id, title, summary, keywords, original_length, summary_length, quiz_pool_size,
+                                  created_at
+                           FROM summaries WHERE id = ? AND user_id = ?''', (summary_id, user_id)).fetchone()
+
+
+def insert_quiz_pool(conn, summary_id, questions):
+    """Store a summary's question pool; question ids are their positions"""
+    conn.executemany('INSERT INTO quiz_pool (summary_id, position, question, options, answer) VALUES (?, ?, ?, ?, ?)',
+                     ((summary_id, q['id'], q['question'], json.dumps(q['options'], separators=(',', ':')),
+                       q['options'].index(q['correct_answer'])) for q in questions))
+    conn.execute('UPDATE summaries SET quiz_pool_size = ? WHERE id = ?', (len(questions), summary_id))
+
+
+def get_quiz_pool_size(conn, summary_id, user_id):
+    """Number of pooled questions, or None if the summary is not the user's"""
+    row = conn.execute('SELECT quiz_pool_size FROM summaries WHERE id = ? AND user_id = ?',
+                       (summary_id, user_id)).fetchone()
+    return None if row is None else row[0]
+
+
+def claim_quiz(conn, summary_id, quiz):
+    """Mark an issued quiz as graded; False if it already was"""
+    cursor = conn.execute('INSERT OR IGNORE INTO graded_quizzes (summary_id, quiz) VALUES (?, ?)',
+                          (summary_id, quiz))
+    return cursor.rowcount == 1
+
+
+def get_quiz_questions(conn, summary_id, positions):
+    """The pooled questions at the given positions, keyed by position"""
+    if not positions:
+        return {}
+    placeholders = ','.join('?' * len(positions))
+    rows = conn.execute(f'''SELECT position, question, options, answer FROM quiz_pool
+                            WHERE summary_id = ? AND position IN ({placeholders})''',
+                        (summary_id, *positions)).fetchall()
+    return {row['position']: row for row in rows}
+
+
+def delete_summary(conn, summary_id, user_id):
+    # The newest remaining summary comes straight from idx_summaries_user_created
+    conn.execute('''UPDATE user_stats SET summaries = summaries - 1, characters = characters - s.length,
+                        last_summary_at = (SELECT max(created_at) FROM summaries WHERE user_id = ? AND id != ?)
+                    FROM (SELECT coalesce(original_length, 0) AS length FROM summaries
+                          WHERE id = ? AND user_id = ?) AS s
+                    WHERE user_stats.user_id = ?''', (user_id, summary_id, summary_id, user_id, user_id))
+    conn.execute('DELETE FROM summary_quiz_stats WHERE summary_id = ? AND user_id = ?', (summary_id, user_id))
+    conn.execute('''DELETE FROM graded_quizzes WHERE summary_id IN
+                    (SELECT id FROM summaries WHERE id = ? AND user_id = ?)''', (summary_id, user_id))
+    # External-content FTS needs the old values to remove a row
+    conn.execute('''INSERT INTO summaries_fts (summaries_fts, rowid, title, summary, keywords, owner)
+                    SELECT 'delete', id, title, summary, keywords, owner
+                    FROM summaries_search_source WHERE id = ? AND owner = ?''', (summary_id, f'u{user_id}'))
+    conn.execute('''DELETE FROM quiz_pool WHERE summary_id IN
+                    (SELECT id FROM summaries WHERE id = ? AND user_id = ?)''', (summary_id, user_id))
+    conn.execute('DELETE FROM summaries WHERE id = ? AND user_id = ?', (summary_id, user_id))
+
+
+def fts_query(text):
+    """Turn free text into a safe FTS5 query; the last word matches as a prefix"""
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*']
+    return ' '.join(terms)
+
+
+def search_summaries(conn, user_id, query, limit, offset=0):
+    """Rank a user's summaries against an FTS5 query, best first
+
+    Title matches weigh most, then keywords, then the summary text. Rows
+    are ranked and limited before snippets are built, so only the
+    returned page pays for highlighting.
+    """
+    match = f'owner:u{user_id} AND ({query})'
+    return conn.execute('''SELECT s.id, s.title, s.created_at,
+                                  snippet(summaries_fts, 1, '<mark>', '</mark>', '…', 16) AS snippet,
+                                  highlight(summaries_fts, 0, '<mark>', '</mark>') AS title_highlight,
+                                  ranked.rank
+                           FROM (SELECT rowid, bm25(summaries_fts, 10.0, 1.0, 5.0, 0.0) AS rank
+                                 FROM summaries_fts WHERE summaries_fts MATCH ?
+                                 ORDER BY rank LIMIT ? OFFSET ?) AS ranked
+                           JOIN summaries_fts ON summaries_fts.rowid = ranked.rowid
+                           JOIN summaries s ON s.id = ranked.rowid
+                           WHERE summaries_fts MATCH ?
+                           ORDER BY ranked.rank''', (match, limit, offset, match)).fetchall()
+
+
+def list_quiz_results(conn, user_id, limit, before=None):
+    """One page of a user's quiz results, newest first; see list_summaries"""
+    if before is None:
+        return conn.execute('''SELECT id, summary_id, score, total_questions, created_at
+                               FROM quiz_results WHERE user_id = ?
+                               ORDER BY created_at DESC, id DESC LIMIT ?''', (user_id, limit)).fetchall()
+    return conn.execute('''SELECT id, summary_id, score, total_questions, created_at
+                           FROM quiz_results WHERE user_id = ? AND (created_at, id) < (?, ?)
+                           ORDER BY created_at DESC, id DESC LIMIT ?''', (user_id, *before, limit)).fetchall()
+
+
+def insert_quiz_result(conn, user_id, summary_id, score, total_questions):
+    """Record a quiz result and fold it into the user's and the summary's stats"""
+    conn.execute('''INSERT INTO quiz_results (user_id, summary_id, score, total_questions)
+                    VALUES (?, ?, ?, ?)''', (user_id, summary_id, score, total_questions))
+    params = {'user_id': user_id, 'summary_id': summary_id, 'score': score, 'total_questions': total_questions}
+    percentage = _percentage(':score', ':total_questions')
+    conn.execute(f'''INSERT INTO user_stats
+                     (user_id, quizzes, questions, correct, best_percentage, last_quiz_at, recent_scores)
+                     VALUES (:user_id, 1, :total_questions, :score, {percentage}, CURRENT_TIMESTAMP,
+                             {_recent_scores(':user_id')})
+                     ON CONFLICT (user_id) DO UPDATE SET quizzes = quizzes + 1,
+                         questions = questions + excluded.questions,
+                         correct = correct + excluded.correct,
+                         best_percentage = max(coalesce(best_percentage, 0), excluded.best_percentage),
+                         last_quiz_at = excluded.last_quiz_at,
+                         recent_scores = excluded.recent_scores''', params)
+    # Only the user's own summaries have per-summary stats
+    conn.execute(f'''INSERT INTO summary_quiz_stats
+                     (summary_id, user_id, attempts, questions, correct, best_percentage, last_percentage,
+                      last_attempt_at)
+                     SELECT id, user_id, 1, :total_questions, :score, {percentage}, {percentage}, CURRENT_TIMESTAMP
+                     FROM summaries WHERE id = :summary_id AND user_id = :user_id
+                     ON CONFLICT (summary_id) DO UPDATE SET attempts = attempts + 1,
+                         questions = questions + excluded.questions,
+                         correct = correct + excluded.correct,
+                         best_percentage = max(coalesce(best_percentage, 0), excluded.best_percentage),
+                         last_percentage = excluded.last_percentage,
+                         last_attempt_at = excluded.last_attempt_at''', params)
+
+
+def get_user_stats(conn, user_id):
+    return conn.execute('SELECT * FROM user_stats WHERE user_id = ?', (user_id,)).fetchone()
+
+
+def get_summary_quiz_stats(conn, summary_id, user_id):
+    """Quiz attempt totals for one summary, or None if the summary is not the user's"""
+    return conn.execute('''SELECT s.id AS summary_id, coalesce(q.attempts, 0) AS attempts,
+                                  coalesce(q.questions, 0) AS questions, coalesce(q.correct, 0) AS correct,
+                                  q.best_percentage, q.last_percentage, q.last_attempt_at
+                           FROM summaries s LEFT JOIN summary_quiz_stats q ON q.summary_id = s.id
+                           WHERE s.id = ? AND s.user_id = ?''', (summary_id, user_id)).fetchone()
+
+
+def rebuild_stats(conn):
+    """Recompute every user's statistics from the summaries and quiz_results tables"""
+    for statement in REBUILD_STATS:
+        conn.execute(statement)
@@ -0,0 +1,656 @@
+import codecs
+import hashlib
+import heapq
+import random
+import re
+import sys
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from functools import lru_cache, partial
+from itertools import chain
+
+import cooccurrence
+import metrics
+import sentence_scoring
+from cooccurrence import DOCUMENT_TERMS, PairCounter, cooccurrence_index
+
+NLTK_RESOURCES = [
+    ('tokenizers/punkt', 'punkt'),
+    ('tokenizers/punkt_tab', 'punkt_tab'),
+    ('corpora/stopwords', 'stopwords')
+]
+
+# NLTK is imported on first use; importing it pulls in most of scipy
+sent_tokenize = word_tokenize = stopwords = stem = None
+
+# Blank lines separate paragraphs; a paragraph without one is cut at a line
+# break (or failing that a space) once it grows past MAX_PARAGRAPH_CHARS
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+MAX_PARAGRAPH_CHARS = 64 * 1024
+
+# Questions generated and stored per document, so quizzes can be retaken
+QUIZ_POOL_SIZE = 50
+
+
+def download_nltk_data():
+    """Download missing NLTK data (run at deploy time: python app.py --download-nltk)"""
+    import nltk
+    for path, name in NLTK_RESOURCES:
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            print(f"Downloading {name}...")
+            nltk.download(name, quiet=True)
+
+
+def load_nltk():
+    """Import NLTK once, failing fast if its data is missing; never downloads"""
+    global sent_tokenize, word_tokenize, stopwords, stem
+    if sent_tokenize is not None:
+        return
+    import nltk
+    missing = []
+    for path, name in NLTK_RESOURCES:
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(name)
+    if missing:
+        raise RuntimeError(f"Missing NLTK data: {', '.join(missing)}. "
+                           f"Run 'python app.py --download-nltk' first.")
+    from nltk.corpus import stopwords as nltk_stopwords
+    from nltk.stem.porter import PorterStemmer
+    from nltk.tokenize import sent_tokenize as nltk_sent_tokenize, word_tokenize as nltk_word_tokenize
+    stem = lru_cache(maxsize=65536)(PorterStemmer().stem)
+    stopwords, word_tokenize, sent_tokenize = nltk_stopwords, nltk_word_tokenize, nltk_sent_tokenize
+
+
+def iter_text_chunks(stream, chunk_size=64 * 1024):
+    """Decode a binary stream as UTF-8, one chunk at a time"""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def fingerprint_text(chunks):
+    """Return the SHA-256 hex digest and character count of streamed text"""
+    digest = hashlib.sha256()
+    length = 0
+    for chunk in chunks:
+        digest.update(chunk.encode('utf-8'))
+        length += len(chunk)
+    return digest.hexdigest(), length
+
+
+def iter_paragraph_spans(chunks):
+    """Split streamed text into (offset, paragraph) pairs of stripped, non-empty paragraphs
+
+    offset is where the stripped paragraph starts in the whole text.
+    """
+    carry, carry_offset = '', 0
+    for chunk in chunks:
+        text = carry + chunk
+        parts, start = [], 0
+        for match in PARAGRAPH_BREAK.finditer(text):
+            parts.append((start, text[start:match.start()]))
+            start = match.end()
+        carry = text[start:]
+        if len(carry) > MAX_PARAGRAPH_CHARS:
+            cut = carry.rfind('\n')
+            if cut <= 0:
+                cut = carry.rfind(' ')
+            if cut > 0:
+                parts.append((start, carry[:cut]))
+                start += cut + 1
+                carry = carry[cut + 1:]
+        for part_start, part in parts:
+            stripped = part.lstrip()
+            if stripped:
+                yield carry_offset + part_start + len(part) - len(stripped), stripped.rstrip()
+        carry_offset += start
+    stripped = carry.lstrip()
+    if stripped:
+        yield carry_offset + len(carry) - len(stripped), stripped.rstrip()
+
+
+def iter_paragraphs(chunks):
+    """Split streamed text into stripped, non-empty paragraphs"""
+    for _, paragraph in iter_paragraph_spans(chunks):
+        yield paragraph
+
+
+def iter_sentence_windows(chunks):
+    """Yield (start, end, tokens) for each sentence, holding one paragraph at a time
+
+    start and end are character offsets into the whole text and tokens are
+    the lowercased word tokens, as in DocumentAnalysis.
+    """
+    load_nltk()
+    # The Punkt model sent_tokenize itself uses, which can also report offsets
+    from nltk.tokenize import _get_punkt_tokenizer
+    punkt = _get_punkt_tokenizer('english')
+    for offset, paragraph in iter_paragraph_spans(chunks):
+        for start, end in punkt.span_tokenize(paragraph):
+            yield offset + start, offset + end, word_tokenize(paragraph[start:end].lower())
+
+
+def read_spans(chunks, spans):
+    """Read the text of each (start, end) span of non-overlapping spans in one pass
+
+    Only text from the next wanted span onwards is kept as the chunks stream past.
+    """
+    wanted = sorted(set(spans))
+    found = {}
+    buffer, buffer_start, i = '', 0, 0
+    for chunk in chunks:
+        if i == len(wanted):
+            break
+        buffer += chunk
+        buffer_end = buffer_start + len(buffer)
+        while i < len(wanted) and wanted[i][1] <= buffer_end:
+            start, end = wanted[i]
+            found[wanted[i]] = buffer[start - buffer_start:end - buffer_start]
+            i += 1
+        keep_from = min(wanted[i][0], buffer_end) if i < len(wanted) else buffer_end
+        if keep_from > buffer_start:
+            buffer = buffer[keep_from - buffer_start:]
+            buffer_start = keep_from
+    return found
+
+
+_stop_words = None
+
+
+def get_stop_words():
+    """Load the English stopword set once per process"""
+    global _stop_words
+    if _stop_words is None:
+        load_nltk()
+        _stop_words = frozenset(stopwords.words('english'))
+    return _stop_words
+
+
+class ParagraphCache:
+    """LRU of per-paragraph analysis keyed by content hash
+
+    Bounded by the estimated memory of the cached entries (see
+    entry_bytes), which is about 12 bytes per character of English text.
+    Entries are shared between documents and must not be modified.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+def entry_bytes(entry):
+    """Rough memory held by one paragraph cache entry
+
+    Counts the sentence and token strings, the lists and tuples holding
+    them and the term id arrays. Kept words are the token strings
+    themselves, so only their tuples are counted.
+    """
+    sentences, tokens, terms, numbered = entry
+    getsizeof = sys.getsizeof
+    size = getsizeof(entry) + getsizeof(sentences) + sum(map(getsizeof, sentences))
+    size += getsizeof(tokens) + sum(getsizeof(words) + sum(map(getsizeof, words)) for words in tokens)
+    size += getsizeof(terms) + sum(map(getsizeof, terms))
+    return size + getsizeof(numbered) + sum(map(getsizeof, numbered))
+
+
+paragraph_cache = ParagraphCache()
+
+
+class TermNumbering:
+    """Process-wide integer ids for kept words
+
+    Paragraphs are numbered when they are analyzed and their ids are cached
+    with them, so a document's term ids are joined from its paragraphs
+    instead of looked up word by word on every request. Once max_terms
+    words have ids the numbering starts over under a new generation, and
+    paragraphs numbered under an older one are renumbered when next used.
+    """
+
+    def __init__(self, max_terms=1024 * 1024):
+        self.max_terms = max_terms
+        self.generation = 0
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def number(self, sentence_terms):
+        """(generation, ids, lengths): the ids of all sentences' words end to end, and each sentence's length"""
+        lengths = array('i', map(len, sentence_terms))
+        with self._lock:
+            if len(self._ids) >= self.max_terms:
+                self._ids = {}
+                self.generation += 1
+            ids = self._ids
+            term_ids = array('i', [ids.setdefault(word, len(ids)) for terms in sentence_terms for word in terms])
+            return self.generation, term_ids, lengths
+
+    def __len__(self):
+        return len(self._ids)
+
+
+term_numbering = TermNumbering()
+
+
+def analyze_paragraph(paragraph):
+    """Sentences, lowercased sentence tokens, kept words per sentence and their term ids for one paragraph
+
+    Edited documents mostly repeat paragraphs that were seen before, so
+    results are cached by content hash and only new paragraphs are tokenized.
+    """
+    key = hashlib.blake2b(paragraph.encode('utf-8'), digest_size=16).digest()
+    entry = paragraph_cache.get(key)
+    if entry is None:
+        stop_words = get_stop_words()
+        sentences = sent_tokenize(paragraph)
+        tokens = [word_tokenize(sentence.lower()) for sentence in sentences]
+        terms = [tuple(word for word in sentence_tokens if word.isalnum() and word not in stop_words)
+                 for sentence_tokens in tokens]
+        entry = (sentences, tokens, terms, term_numbering.number(terms))
+        paragraph_cache.put(key, entry, entry_bytes(entry))
+    elif entry[3][0] != term_numbering.generation:
+        # Numbered before the term ids last started over
+        entry = entry[:3] + (term_numbering.number(entry[2]),)
+        paragraph_cache.put(key, entry, entry_bytes(entry))
+    return entry
+
+
+class DocumentAnalysis:
+    """Sentences, tokens and word frequencies of a document, computed once per upload
+
+    Takes the document as an iterable of text chunks, so uploads can be
+    analyzed straight from the request stream. Work is done paragraph by
+    paragraph through the paragraph cache and the counts are merged, so a
+    re-upload with a few edited paragraphs only tokenizes those.
+    """
+
+    def __init__(self, chunks):
+        if isinstance(chunks, str):
+            chunks = [chunks]
+        self.stop_words = get_stop_words()
+        self.char_count = 0
+        self.sentences = []
+        self.sentence_tokens = []
+        # The non-stopword alphanumeric tokens of each sentence
+        self.sentence_terms = []
+        # (generation, term ids, sentence lengths) of each paragraph
+        self._numbered = []
+        for paragraph in iter_paragraphs(self._counted(chunks)):
+            sentences, tokens, terms, numbered = analyze_paragraph(paragraph)
+            self.sentences.extend(sentences)
+            self.sentence_tokens.extend(tokens)
+            self.sentence_terms.extend(terms)
+            self._numbered.append(numbered)
+        # One C-level count over all terms beats merging per-paragraph Counters
+        self.word_freq = Counter(chain.from_iterable(self.sentence_terms))
+        self._terms = None
+        self._keyword_ranking = None
+
+    def _counted(self, chunks):
+        """Count characters as they stream past"""
+        for chunk in chunks:
+            self.char_count += len(chunk)
+            yield chunk
+
+    def _index_terms(self):
+        """Join the paragraphs' term ids and sentence lengths"""
+        if self._terms is None:
+            term_ids = array('i')
+            sentence_lengths = array('i')
+            if len({generation for generation, _, _ in self._numbered}) == 1:
+                for _, ids, lengths in self._numbered:
+                    term_ids.extend(ids)
+                    sentence_lengths.extend(lengths)
+            else:
+                # The numbering started over while this document was analyzed
+                ids = {}
+                for terms in self.sentence_terms:
+                    term_ids.extend([ids.setdefault(word, len(ids)) for word in terms])
+                    sentence_lengths.append(len(terms))
+            self._terms = (term_ids, sentence_lengths)
+        return self._terms
+
+    # Only the vector summary engines need term ids, so they are joined on first use.
+    # Ids are process-wide, so they are not dense within one document.
+    @property
+    def term_ids(self):
+        return self._index_terms()[0]
+
+    @property
+    def sentence_lengths(self):
+        return self._index_terms()[1]
+
+    def keyword_ranking(self):
+        """Words longer than 3 characters, most frequent first"""
+        if self._keyword_ranking is None:
+            self._keyword_ranking = [word for word, freq in self.word_freq.most_common() if len(word) > 3]
+        return self._keyword_ranking
+
+
+def check_engine(engine):
+    """Raise ValueError unless engine is a summary engine this install can run"""
+    if engine not in sentence_scoring.ENGINES:
+        raise ValueError(f"Unknown summary engine '{engine}'")
+    if engine in sentence_scoring.VECTOR_ENGINES and not sentence_scoring.available():
+        raise ValueError(f"The '{engine}' summary engine is not installed on this server")
+
+
+def summarize_text(doc, num_sentences=5, engine='frequency'):
+    """Summarize text"""
+    sentences = doc.sentences
+    if len(sentences) <= num_sentences:
+        return ' '.join(sentences)
+    
+    if engine != 'frequency':
+        return ' '.join(sentences[idx] for idx in sentence_scoring.top_sentences(doc, num_sentences, engine))
+    
+    word_freq = doc.word_freq
+    
+    sentence_scores = {}
+    # Stopwords are not in word_freq, so only a sentence's terms add to its score
+    for sentence, terms in zip(sentences, doc.sentence_terms):
+        sentence_scores[sentence] = sum(map(word_freq.__getitem__, terms))
+    
+    top_sentences = sorted(sentence_scores, key=sentence_scores.get, reverse=True)[:num_sentences]
+    
+    summary = []
+    for sentence in sentences:
+        if sentence in top_sentences:
+            summary.append(sentence)
+    
+    return ' '.join(summary)
+
+
+def extract_keywords(doc, num_keywords=10):
+    """Extract keywords from text"""
+    return doc.keyword_ranking()[:num_keywords]
+
+
+def build_keyword_index(doc, keywords):
+    """Map each keyword to the ids of the sentences that contain it as a token"""
+    keyword_set = set(keywords)
+    index = {}
+    # Keywords are always terms, and a sentence has fewer terms than tokens
+    for idx, terms in enumerate(doc.sentence_terms):
+        for word in keyword_set.intersection(terms):
+            index.setdefault(word, []).append(idx)
+    return index
+
+
+def document_relations(counter):
+    """related(word) for make_question: words sharing sentences with it in this document and the corpus
+
+    The document's counts are added to the corpus index on the way.
+    """
+    document = counter.matrix()
+    cooccurrence_index.add_document(document)
+    return partial(cooccurrence_index.related, document=document)
+
+
+def iter_quiz(doc, num_questions=5):
+    """Generate MCQ quiz questions from text, one at a time, numbered from 0"""
+    sentences = doc.sentences
+    keywords = extract_keywords(doc, num_keywords=20)
+    related = None
+    if cooccurrence.available():
+        counter = PairCounter(doc.keyword_ranking()[:DOCUMENT_TERMS])
+        for terms in doc.sentence_terms:
+            counter.add(terms)
+        related = document_relations(counter)
+    
+    # Only keywords longer than 4 characters are used as answers
+    answer_words = {kw for kw in keywords if len(kw) > 4}
+    keyword_index = build_keyword_index(doc, answer_words)
+    candidates = sorted(set().union(*keyword_index.values()))
+    
+    for position, idx in enumerate(random.sample(candidates, min(num_questions, len(candidates)))):
+        important_words = [w for w in doc.sentence_tokens[idx] if w in answer_words]
+        yield make_question(position, sentences[idx], important_words, keywords, related)
+
+
+def make_question(position, sentence, important_words, keywords, related=None):
+    """Blank out one of a sentence's answer words and offer three wrong options
+
+    Wrong options are the words related(answer) ranks as sharing most
+    context with the answer, topped up with other keywords in random order.
+    Words elsewhere in the sentence, which would give the answer away, and
+    words with the answer's stem, such as its plural, are skipped while
+    there are enough others.
+    """
+    correct_answer = random.choice(important_words)
+    question_text = re.sub(r'\b' + correct_answer + r'\b', '__', sentence, flags=re.IGNORECASE)
+    
+    others = [w for w in keywords if w != correct_answer]
+    random.shuffle(others)
+    sentence_words = set(re.findall(r'\w+', sentence.lower()))
+    answer_stem = stem(correct_answer)
+    wrong_options = []
+    for word in chain(related(correct_answer) if related is not None else (), others):
+        if len(wrong_options) == 3:
+            break
+        if word not in wrong_options and word not in sentence_words and stem(word) != answer_stem:
+            wrong_options.append(word)
+    for word in others:
+        if len(wrong_options) == 3:
+            break
+        if word not in wrong_options:
+            wrong_options.append(word)
+    
+    all_options = wrong_options + [correct_answer]
+    random.shuffle(all_options)
+    
+    return {
+        'id': position,
+        'question': question_text,
+        'options': all_options,
+        'correct_answer': correct_answer
+    }
+
+
+def generate_quiz(doc, num_questions=5):
+    """Generate MCQ quiz from text"""
+    return list(iter_quiz(doc, num_questions))
+
+
+def run_pipeline(chunks, num_sentences, num_questions, engine='frequency'):
+    """Summarize, quiz and extract keywords from a document
+
+    quiz_pool holds every generated question; quiz is its first num_questions.
+    """
+    with metrics.stage('analyze'):
+        doc = DocumentAnalysis(chunks)
+    metrics.observe_document(doc.char_count, len(doc.sentences))
+    with metrics.stage('summarize'):
+        summary = summarize_text(doc, num_sentences, engine)
+    with metrics.stage('quiz'):
+        # The quiz is the start of the pool, which is random order already
+        quiz_pool = generate_quiz(doc, max(num_questions, QUIZ_POOL_SIZE))
+    with metrics.stage('keywords'):
+        keywords = extract_keywords(doc, num_keywords=10)
+    return {
+        'summary': summary,
+        'quiz': quiz_pool[:num_questions],
+        'quiz_pool': quiz_pool,
+        'keywords': keywords,
+        'original_length': doc.char_count,
+        'summary_length': len(summary)
+    }
+
+
+def run_pipeline_windowed(open_chunks, num_sentences, num_questions):
+    """run_pipeline for the frequency engine, in memory that does not grow with the document
+
+    open_chunks() must return a fresh iterator over the text on every call;
+    the text is read three times. The first pass counts words. The second
+    scores sentences into a heap of the best num_sentences and
+    reservoir-samples quiz sentences, keeping only their offsets. The third
+    reads those few sentences back. Per request this holds one paragraph,
+    the word counts and the chosen offsets, never the sentence lists. Both
+    passes tokenize and the paragraph cache is bypassed, so this is slower
+    than run_pipeline and meant for very large documents only.
+    """
+    stop_words = get_stop_words()
+    char_count = sentence_count = 0
+    
+    def counted(chunks):
+        nonlocal char_count
+        for chunk in chunks:
+            char_count += len(chunk)
+            yield chunk
+    
+    with metrics.stage('analyze'):
+        word_freq = Counter()
+        for _, _, tokens in iter_sentence_windows(counted(open_chunks())):
+            word_freq.update(word for word in tokens if word.isalnum() and word not in stop_words)
+            sentence_count += 1
+    metrics.observe_document(char_count, sentence_count)
+    
+    keyword_ranking = [word for word, freq in word_freq.most_common() if len(word) > 3]
+    quiz_keywords = keyword_ranking[:20]
+    answer_words = {kw for kw in quiz_keywords if len(kw) > 4}
+    pool_size = max(num_questions, QUIZ_POOL_SIZE)
+    # Co-occurrence among the top terms is counted in a table of bounded size
+    counter = PairCounter(keyword_ranking[:DOCUMENT_TERMS]) if cooccurrence.available() else None
+    
+    with metrics.stage('summarize'):
+        # Min-heap of (score, -index, start, end): ties go to the earlier sentence
+        best = []
+        quiz_candidates = []
+        seen = 0
+        for index, (start, end, tokens) in enumerate(iter_sentence_windows(open_chunks())):
+            score = sum(word_freq[word] for word in tokens if word.isalnum() and word not in stop_words)
+            if counter is not None:
+                counter.add(tokens)
+            entry = (score, -index, start, end)
+            if len(best) < num_sentences:
+                heapq.heappush(best, entry)
+            elif best and entry > best[0]:
+                heapq.heapreplace(best, entry)
+            
+            important_words = [w for w in tokens if w in answer_words]
+            if important_words:
+                # Reservoir sampling: every candidate ends up in the pool with equal probability
+                seen += 1
+                if len(quiz_candidates) < pool_size:
+                    quiz_candidates.append((start, end, important_words))
+                else:
+                    slot = random.randrange(seen)
+                    if slot < pool_size:
+                        quiz_candidates[slot] = (start, end, important_words)
+    
+    with metrics.stage('quiz'):
+        summary_spans = sorted((start, end) for _, _, start, end in best)
+        texts = read_spans(open_chunks(), summary_spans + [(start, end) for start, end, _ in quiz_candidates])
+        random.shuffle(quiz_candidates)
+        related = document_relations(counter) if counter is not None else None
+        quiz_pool = [make_question(position, texts[(start, end)], important_words, quiz_keywords, related)
+                     for position, (start, end, important_words) in enumerate(quiz_candidates)]
+    
+    summary = ' '.join(texts[span] for span in summary_spans)
+    return {
+        'summary': summary,
+        'quiz': quiz_pool[:num_questions],
+        'quiz_pool': quiz_pool,
+        'keywords': keyword_ranking[:10],
+        'original_length': char_count,
+        'summary_length': len(summary)
+    }
+
+
+def iter_pipeline(chunks, num_sentences, num_questions, engine='frequency'):
+    """Run the pipeline part by part, yielding (event, payload) as each part is ready
+
+    Yields 'keywords', then 'summary', then one 'question' per quiz
+    question, and last 'result' with the same dict run_pipeline returns.
+    """
+    with metrics.stage('analyze'):
+        doc = DocumentAnalysis(chunks)
+    metrics.observe_document(doc.char_count, len(doc.sentences))
+    with metrics.stage('keywords'):
+        keywords = extract_keywords(doc, num_keywords=10)
+    yield 'keywords', keywords
+    
+    with metrics.stage('summarize'):
+        summary = summarize_text(doc, num_sentences, engine)
+    yield 'summary', {'summary': summary, 'original_length': doc.char_count, 'summary_length': len(summary)}
+    
+    quiz_pool = []
+    for question in iter_quiz(doc, max(num_questions, QUIZ_POOL_SIZE)):
+        quiz_pool.append(question)
+        if len(quiz_pool) <= num_questions:
+            yield 'question', question
+    
+    yield 'result', {
+        'summary': summary,
+        'quiz': quiz_pool[:num_questions],
+        'quiz_pool': quiz_pool,
+        'keywords': keywords,
+        'original_length': doc.char_count,
+        'summary_length': len(summary)
+    }
+
+
+def iter_result_events(result):
+    """Replay a finished result as the events iter_pipeline would have yielded"""
+    yield 'keywords', result['keywords']
+    yield 'summary', {key: result[key] for key in ('summary', 'original_length', 'summary_length')}
+    for question in result['quiz']:
+        yield 'question', question
+    yield 'result', result
+
+
+def warm_nltk():
+    """Load the Punkt model and stopword set now rather than on the first request"""
+    get_stop_words()
+    word_tokenize(' '.join(sent_tokenize('Warm up the tokenizer. It is loaded lazily.')))
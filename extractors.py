@@ -0,0 +1,309 @@
+import hashlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+
+from engine import fingerprint_text, iter_text_chunks
+
+# pypdf is optional; PDF uploads are refused without it
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+SNIFF_BYTES = 2048
+PDF_PAGES_PER_TASK = 8
+# Compressed formats can expand far past their upload size, so extraction
+# stops with an error once a document's text passes this many characters
+MAX_EXTRACTED_CHARS = 16 * 1024 * 1024
+# A DOCX whose word/document.xml is larger than this per allowed character
+# is refused before it is decompressed
+DOCX_XML_BYTES_PER_CHAR = 16
+
+_WORD = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_HTML_SKIP = frozenset(('script', 'style', 'head', 'title', 'template', 'noscript'))
+_HTML_BLOCKS = frozenset(('p', 'div', 'br', 'li', 'ul', 'ol', 'table', 'tr', 'section', 'article', 'header',
+                          'footer', 'blockquote', 'pre', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'))
+
+
+class ExtractionError(ValueError):
+    """A document that cannot be read as text"""
+
+
+def sniff(head, filename=''):
+    """Guess a document's type from its first bytes, falling back to its extension"""
+    if head.startswith(b'%PDF-'):
+        return 'pdf'
+    if head.startswith(b'PK\x03\x04'):
+        return 'zip'
+    start = head.lstrip(b'\xef\xbb\xbf \t\r\n')[:256].lower()
+    if start.startswith((b'<!doctype html', b'<html')) or filename.lower().endswith(('.html', '.htm')):
+        return 'html'
+    return 'txt'
+
+
+def too_long(max_chars):
+    return ExtractionError(f'Document text is longer than {max_chars} characters')
+
+
+def iter_plain_text(stream, chunk_size, path=None, max_chars=MAX_EXTRACTED_CHARS):
+    return iter_text_chunks(stream, chunk_size)
+
+
+def iter_docx_text(stream, chunk_size, path=None, max_chars=MAX_EXTRACTED_CHARS):
+    """Paragraph text of word/document.xml, parsed as it is decompressed
+
+    The member's declared size is checked first; zipfile never inflates
+    past it, so a small archive cannot expand into an unbounded parse.
+    """
+    with zipfile.ZipFile(stream) as archive:
+        try:
+            info = archive.getinfo('word/document.xml')
+        except KeyError:
+            raise ExtractionError('Not a Word document (no word/document.xml)')
+        if info.file_size > max_chars * DOCX_XML_BYTES_PER_CHAR:
+            raise too_long(max_chars)
+        with archive.open(info) as xml:
+            pending, size = [], 0
+            for _, elem in ET.iterparse(xml, events=('end',)):
+                if elem.tag != _WORD + 'p':
+                    continue
+                parts = []
+                for node in elem.iter():
+                    if node.tag == _WORD + 't' and node.text:
+                        parts.append(node.text)
+                    elif node.tag == _WORD + 'tab':
+                        parts.append('\t')
+                    elif node.tag in (_WORD + 'br', _WORD + 'cr'):
+                        parts.append('\n')
+                # Nested paragraphs (text boxes) are cleared once read, so never counted twice
+                elem.clear()
+                paragraph = ''.join(parts)
+                if paragraph.strip():
+                    pending.append(paragraph)
+                    size += len(paragraph)
+                if size >= chunk_size:
+                    yield '\n\n'.join(pending) + '\n\n'
+                    pending, size = [], 0
+            if pending:
+                yield '\n\n'.join(pending)
+
+
+class _HTMLText(HTMLParser):
+    """Collect visible text, with a paragraph break at each block element"""
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _HTML_SKIP:
+            self._skip += 1
+        elif tag in _HTML_BLOCKS:
+            self.parts.append('\n\n')
+
+    def handle_endtag(self, tag):
+        if tag in _HTML_SKIP:
+            self._skip = max(self._skip - 1, 0)
+        elif tag in _HTML_BLOCKS:
+            self.parts.append('\n\n')
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+    def take(self):
+        text = ''.join(self.parts)
+        self.parts = []
+        return text
+
+
+def iter_html_text(stream, chunk_size, path=None, max_chars=MAX_EXTRACTED_CHARS):
+    parser = _HTMLText()
+    for chunk in iter_text_chunks(stream, chunk_size):
+        parser.feed(chunk)
+        text = parser.take()
+        if text:
+            yield text
+    parser.close()
+    text = parser.take()
+    if text:
+        yield text
+
+
+def _page_text(reader, start, stop):
+    return '\n'.join(reader.pages[i].extract_text() or '' for i in range(start, stop)) + '\n'
+
+
+_worker_pdf = (None, None)
+
+
+def _pdf_pages(path, start, stop):
+    """Text of pages start..stop-1, in a pool worker
+
+    The parsed file is kept for the worker's next task, which is nearly
+    always the same document.
+    """
+    global _worker_pdf
+    stat = os.stat(path)
+    key = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if _worker_pdf[0] != key:
+        _worker_pdf = (None, None)
+        _worker_pdf = (key, pypdf.PdfReader(path))
+    return _page_text(_worker_pdf[1], start, stop)
+
+
+class PdfExtractor:
+    """Extract PDF text page by page across a process pool
+
+    pypdf is pure Python, so pages are spread over processes rather than
+    threads. Text is yielded in page order as each batch of pages finishes,
+    so the analyzer can start on the first pages while later ones are
+    still being parsed. Inside a daemonic worker (the batch CLI's pool),
+    which may not start processes, pages are read in-process.
+
+    Workers open the PDF by path. An upload is always copied to a temp
+    file first: a stream's own name (a zip member's, say) is chosen by
+    whoever sent it and never read from disk.
+    """
+
+    def __init__(self, max_workers=None, pages_per_task=PDF_PAGES_PER_TASK):
+        self.max_workers = max_workers or os.cpu_count()
+        self.pages_per_task = pages_per_task
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def iter_text(self, stream, chunk_size, path=None):
+        """Text of the PDF in stream; path, if given, is the trusted file the caller opened it from"""
+        if path is not None:
+            yield from self._iter_path(path)
+            return
+        # Uploads may be spooled in memory; workers need a file they can open
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as f:
+            shutil.copyfileobj(stream, f, chunk_size)
+            f.flush()
+            yield from self._iter_path(f.name)
+
+    def _iter_path(self, path):
+        try:
+            reader = pypdf.PdfReader(path)
+            num_pages = len(reader.pages)
+        except pypdf.errors.PdfReadError as e:
+            raise ExtractionError(f'Could not read PDF: {e}')
+        ranges = [(start, min(start + self.pages_per_task, num_pages))
+                  for start in range(0, num_pages, self.pages_per_task)]
+        if len(ranges) <= 1 or self.max_workers <= 1 or multiprocessing.current_process().daemon:
+            for start, stop in ranges:
+                yield _page_text(reader, start, stop)
+            return
+        del reader
+        futures = [self.pool.submit(_pdf_pages, path, start, stop) for start, stop in ranges]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            # The file may be deleted once we return, so drop what has not started
+            for future in futures:
+                future.cancel()
+
+
+pdf_extractor = PdfExtractor()
+
+
+def iter_pdf_text(stream, chunk_size, path=None, max_chars=MAX_EXTRACTED_CHARS):
+    if pypdf is None:
+        raise ExtractionError('PDF files are not supported on this server (pypdf is not installed)')
+    return pdf_extractor.iter_text(stream, chunk_size, path)
+
+
+EXTRACTORS = {
+    'txt': iter_plain_text,
+    'pdf': iter_pdf_text,
+    'docx': iter_docx_text,
+    'html': iter_html_text,
+}
+
+
+def document_type(stream, filename=''):
+    """Sniff a seekable binary stream's type from its start, leaving it there
+
+    Zip files are 'docx' when they hold word/document.xml, else 'zip'.
+    """
+    stream.seek(0)
+    head = stream.read(SNIFF_BYTES)
+    stream.seek(0)
+    kind = sniff(head, filename)
+    if kind == 'zip':
+        try:
+            with zipfile.ZipFile(stream) as archive:
+                if 'word/document.xml' in archive.namelist():
+                    kind = 'docx'
+        except zipfile.BadZipFile:
+            pass
+        stream.seek(0)
+    return kind
+
+
+def _limited(chunks, max_chars):
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        if total > max_chars:
+            raise too_long(max_chars)
+        yield chunk
+
+
+def iter_document_text(stream, kind, chunk_size=64 * 1024, path=None, max_chars=None):
+    """Text of a document of the given type, as an iterator of chunks
+
+    Pass path only when the caller opened stream from that file itself;
+    it is never taken from the stream, whose name may come from an upload.
+    Raises ExtractionError once the text passes max_chars (by default
+    MAX_EXTRACTED_CHARS).
+    """
+    extractor = EXTRACTORS.get(kind)
+    if extractor is None:
+        raise ExtractionError(f"Unsupported file type '{kind}'")
+    if max_chars is None:
+        max_chars = MAX_EXTRACTED_CHARS
+    return _limited(extractor(stream, chunk_size, path, max_chars), max_chars)
+
+
+def fingerprint_document(stream, kind, chunk_size=64 * 1024):
+    """Result cache digest of a document, leaving the stream at the start
+
+    Text is keyed by its decoded content. Other types are keyed by their
+    bytes, tagged with the type, so a repeat upload is answered without
+    being parsed again.
+    """
+    if kind == 'txt':
+        digest, _ = fingerprint_text(iter_text_chunks(stream, chunk_size))
+    else:
+        sha = hashlib.sha256()
+        for data in iter(lambda: stream.read(chunk_size), b''):
+            sha.update(data)
+        digest = f'{kind}:{sha.hexdigest()}'
+    stream.seek(0)
+    return digest
+
+
+def extract_text_from_file(file_path):
+    """Extract text from a txt, PDF, DOCX or HTML file"""
+    with open(file_path, 'rb') as f:
+        return ''.join(iter_document_text(f, document_type(f, file_path), path=file_path))
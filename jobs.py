@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobManager:
+    """Run document pipelines on a process pool, keeping job state in SQLite
+
+    The pool is created on first use, so importing the web app in a worker
+    process never starts a nested pool. Results are written to the jobs
+    table as soon as they finish and outlive the web worker that queued them.
+    """
+
+    def __init__(self, db, max_workers=None, initializer=None):
+        self.db = db
+        self.max_workers = max_workers
+        self.initializer = initializer
+        self._executor = None
+        self._events = {}
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     initializer=self.initializer)
+            return self._executor
+
+    def submit(self, user_id, title, fn, *args, on_result=None, on_finish=None):
+        """Queue fn(*args) and return the new job id
+
+        on_result, if given, runs in the web process with the worker's
+        result and returns the payload that is stored for the job.
+        on_finish, if given, is called once the job is stored, whether it
+        succeeded or failed.
+        """
+        job_id = uuid.uuid4().hex
+        with self.db.connection() as conn:
+            conn.execute('INSERT INTO jobs (id, user_id, title, status, owner_pid) VALUES (?, ?, ?, ?, ?)',
+                         (job_id, user_id, title, 'pending', os.getpid()))
+
+        event = threading.Event()
+        with self._lock:
+            self._events[job_id] = event
+
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception as e:
+            with self._lock:
+                self._events.pop(job_id, None)
+            with self.db.connection() as conn:
+                conn.execute("UPDATE jobs SET status = 'failed', error = ? WHERE id = ?", (str(e), job_id))
+            raise
+        future.add_done_callback(lambda f: self._finish(job_id, f, on_result, on_finish))
+        return job_id
+
+    def record(self, user_id, title, payload):
+        """Store an already finished job, e.g. one answered from the result cache"""
+        job_id = uuid.uuid4().hex
+        with self.db.connection() as conn:
+            conn.execute('''INSERT INTO jobs (id, user_id, title, status, result, owner_pid, finished_at)
+                            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)''',
+                         (job_id, user_id, title, 'done', json.dumps(payload), os.getpid()))
+        return job_id
+
+    def _finish(self, job_id, future, on_result, on_finish=None):
+        status, result, error = 'done', None, None
+        try:
+            payload = future.result()
+            if on_result is not None:
+                payload = on_result(payload)
+            result = json.dumps(payload)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            print(traceback.format_exc())
+            status, error = 'failed', str(e)
+
+        try:
+            with self.db.connection() as conn:
+                conn.execute('''UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+                                WHERE id = ?''', (status, result, error, job_id))
+        finally:
+            with self._lock:
+                event = self._events.pop(job_id, None)
+            if event is not None:
+                event.set()
+            if on_finish is not None:
+                on_finish()
+
+    def get(self, job_id, user_id):
+        """Return the job as a dict, or None if it does not belong to user_id"""
+        with self.db.connection() as conn:
+            row = conn.execute('''SELECT id, status, title, result, error, owner_pid, created_at, finished_at
+                                  FROM jobs WHERE id = ? AND user_id = ?''', (job_id, user_id)).fetchone()
+            if row is None:
+                return None
+
+            job = dict(row)
+            owner_pid = job.pop('owner_pid')
+            if job['status'] == 'pending' and owner_pid != os.getpid() and not _pid_alive(owner_pid):
+                # The web worker that queued this job died before it finished
+                job['status'], job['error'] = 'failed', 'Interrupted by a server restart'
+                conn.execute('''UPDATE jobs SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+                                WHERE id = ? AND status = 'pending' ''', (job['status'], job['error'], job_id))
+
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def wait(self, job_id, user_id, timeout):
+        """Block up to timeout seconds for the job to finish, then return it"""
+        with self._lock:
+            event = self._events.get(job_id)
+        if event is not None:
+            event.wait(timeout)
+            return self.get(job_id, user_id)
+
+        # Queued by another web worker: poll the table
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id, user_id)
+            if job is None or job['status'] != 'pending' or time.monotonic() >= deadline:
+                return job
+            time.sleep(min(0.25, max(deadline - time.monotonic(), 0)))
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
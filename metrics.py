@@ -0,0 +1,244 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(8))  # 1KB .. 16MB
+COUNT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_NULL_STAGE = nullcontext()
+
+# Per-request stage durations for the Server-Timing header, set only while
+# a request that asked for them is being handled
+_server_timing = ContextVar('server_timing', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                # One count per bucket (non-cumulative), then sum and count
+                series = self._values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}')
+            le = 'le="+Inf"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.labels, label_values, le)} {series[-1]}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(series[-2])}')
+            lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+
+class _Stage:
+    """Time one pipeline stage into the stage histogram and Server-Timing"""
+
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        self.metrics.stage_seconds.observe(elapsed, self.name)
+        add_server_timing(self.name, elapsed)
+        return False
+
+
+class Metrics:
+    """In-process metrics for the study helper, rendered in Prometheus text format
+
+    Every hook checks enabled first, so a disabled registry costs one
+    attribute lookup per call. Values are per process: with several web
+    workers each one reports its own series.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stage_seconds = Histogram('study_helper_stage_seconds', 'Time spent in each processing stage.',
+                                       LATENCY_BUCKETS, labels=('stage',))
+        self.document_chars = Histogram('study_helper_document_chars', 'Characters per processed document.',
+                                        SIZE_BUCKETS)
+        self.document_sentences = Histogram('study_helper_document_sentences', 'Sentences per processed document.',
+                                            COUNT_BUCKETS)
+        self.db_seconds = Histogram('study_helper_db_seconds',
+                                    'Time a database connection was held, including commit, by route.',
+                                    LATENCY_BUCKETS, labels=('route',))
+        self.request_seconds = Histogram('study_helper_request_seconds', 'Request latency by route.',
+                                         LATENCY_BUCKETS, labels=('route',))
+        self.requests = Counter('study_helper_requests_total', 'Requests handled, by route and status code.',
+                                labels=('route', 'status'))
+        self.in_flight = Gauge('study_helper_requests_in_flight', 'Requests currently being handled.')
+        self.in_flight.inc(amount=0)
+        self.admission_wait_seconds = Histogram('study_helper_admission_wait_seconds',
+                                                'Time documents queued before processing, by lane.',
+                                                LATENCY_BUCKETS, labels=('lane',))
+        self.admission_running = Gauge('study_helper_admission_running', 'Documents being processed, by lane.',
+                                       labels=('lane',))
+        self.admission_queued = Gauge('study_helper_admission_queued', 'Documents waiting to be processed, by lane.',
+                                      labels=('lane',))
+        self.admission_rejected_total = Counter('study_helper_admission_rejected_total',
+                                                'Documents turned away with 503, by lane and reason.',
+                                                labels=('lane', 'reason'))
+
+    def stage(self, name):
+        """Context manager timing one stage; a shared no-op when disabled"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def observe_document(self, chars, sentences):
+        if self.enabled:
+            self.document_chars.observe(chars)
+            self.document_sentences.observe(sentences)
+
+    def observe_db(self, route, seconds):
+        if self.enabled:
+            self.db_seconds.observe(seconds, route)
+            add_server_timing('db', seconds)
+
+    def request_started(self):
+        if self.enabled:
+            self.in_flight.inc()
+
+    def request_finished(self, route, status, seconds):
+        if self.enabled:
+            self.in_flight.dec()
+            self.request_seconds.observe(seconds, route)
+            self.requests.inc(route, str(status))
+
+    def observe_admission(self, lane, seconds):
+        if self.enabled:
+            self.admission_wait_seconds.observe(seconds, lane)
+            add_server_timing('queue', seconds)
+
+    def set_admission(self, lane, running, queued):
+        if self.enabled:
+            self.admission_running.set(running, lane)
+            self.admission_queued.set(queued, lane)
+
+    def admission_rejected(self, lane, reason):
+        if self.enabled:
+            self.admission_rejected_total.inc(lane, reason)
+
+    def render(self):
+        lines = []
+        for metric in (self.stage_seconds, self.document_chars, self.document_sentences, self.db_seconds,
+                       self.request_seconds, self.requests, self.in_flight, self.admission_wait_seconds,
+                       self.admission_running, self.admission_queued, self.admission_rejected_total):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def begin_server_timing():
+    """Start collecting Server-Timing entries for the current request"""
+    return _server_timing.set({})
+
+
+def end_server_timing(token):
+    """Stop collecting and return the header value, or None if nothing was timed"""
+    timings = _server_timing.get()
+    _server_timing.reset(token)
+    if not timings:
+        return None
+    return ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.items())
+
+
+def add_server_timing(name, seconds):
+    timings = _server_timing.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+# The process-wide registry; the web app enables it in create_app()
+registry = Metrics()
+stage = registry.stage
+observe_document = registry.observe_document
@@ -0,0 +1,290 @@
+import hashlib
+import re
+import threading
+import time
+import zlib
+from functools import lru_cache
+
+# numpy is optional; without it uploads are only matched by their exact digest
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NUM_PERM = 128
+SHINGLE_WORDS = 5
+# Additions wait in a dict until this many are merged into the sorted arrays
+MERGE_EVERY = 4096
+# Signatures compared per lookup, taken from the candidates sharing most bands
+MAX_CANDIDATES = 32
+BLOCK_SHINGLES = 8192
+
+_WORD = re.compile(r'\w+')
+_FOLD = 0x100000001b3
+_BAND_SALT = 0x9e3779b97f4a7c15
+_OWNER_SALT = 0xc2b2ae3d27d4eb4f
+
+
+def available():
+    """Whether near-duplicate lookup can run"""
+    return np is not None
+
+
+@lru_cache(maxsize=None)
+def _permutations(num_perm):
+    # Derived from a fixed string rather than a seeded RNG, so stored signatures stay comparable
+    data = hashlib.shake_128(b'study-helper minhash').digest(num_perm * 16)
+    words = np.frombuffer(data, dtype='<u8').astype(np.uint64)
+    return words[:num_perm] | np.uint64(1), words[num_perm:]
+
+
+def _fold(columns, seed=0):
+    """Combine equal-length uint64 arrays into one hash per position"""
+    h = np.full(len(columns[0]), seed, dtype=np.uint64)
+    for column in columns:
+        h = h * np.uint64(_FOLD) + column
+    return h
+
+
+def _iter_word_hashes(chunks):
+    """crc32 of each lowercased word of streamed text, as uint64 arrays"""
+    tail = ''
+    for chunk in chunks:
+        text = tail + chunk
+        # The last word may continue in the next chunk
+        cut = len(text)
+        while cut and (text[cut - 1].isalnum() or text[cut - 1] == '_'):
+            cut -= 1
+        tail = text[cut:]
+        words = _WORD.findall(text[:cut].lower())
+        if words:
+            yield np.fromiter((zlib.crc32(w.encode('utf-8')) for w in words), dtype=np.uint64, count=len(words))
+    if tail:
+        yield np.array([zlib.crc32(tail.lower().encode('utf-8'))], dtype=np.uint64)
+
+
+def minhash(chunks, num_perm=NUM_PERM, shingle_words=SHINGLE_WORDS):
+    """MinHash signature of the word shingles of streamed text, or None if it has no words
+
+    Each permutation is a multiply-shift hash of the 32-bit shingle hash,
+    and shingles are hashed a block at a time, so memory does not grow
+    with the document.
+    """
+    a, b = _permutations(num_perm)
+    signature = np.full(num_perm, 0xFFFFFFFF, dtype=np.uint64)
+    carry = np.empty(0, dtype=np.uint64)
+    seen = 0
+    for hashes in _iter_word_hashes(chunks):
+        seen += len(hashes)
+        tokens = np.concatenate((carry, hashes))
+        count = len(tokens) - shingle_words + 1
+        if count > 0:
+            h = _fold([tokens[j:j + count] for j in range(shingle_words)])
+            shingles = (h ^ (h >> np.uint64(32))) & np.uint64(0xFFFFFFFF)
+            for start in range(0, len(shingles), BLOCK_SHINGLES):
+                block = shingles[start:start + BLOCK_SHINGLES, None]
+                np.minimum(signature, ((block * a + b) >> np.uint64(32)).min(axis=0), out=signature)
+        carry = tokens[-(shingle_words - 1):] if shingle_words > 1 else carry
+    if seen == 0:
+        return None
+    if seen < shingle_words:
+        # Too short for one full shingle: the whole text is the only one
+        h = _fold([carry[j:j + 1] for j in range(len(carry))])
+        shingle = (h ^ (h >> np.uint64(32))) & np.uint64(0xFFFFFFFF)
+        signature = (shingle[:, None] * a + b) >> np.uint64(32)
+        signature = signature[0]
+    return signature.astype(np.uint32)
+
+
+def lsh_layout(threshold, num_perm=NUM_PERM, false_negative_weight=0.9):
+    """(bands, rows) whose candidate probability best separates similarities around threshold
+
+    A pair with Jaccard similarity s shares a band with probability
+    1 - (1 - s**rows)**bands. The layout minimizes the weighted area of
+    false positives below threshold and false negatives above it. Misses
+    weigh more, since every candidate's full signature is checked anyway.
+    """
+    s = np.linspace(0.0, 1.0, 1001)
+    step = s[1] - s[0]
+    below = s < threshold
+    best, best_error = (1, num_perm), None
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            p = 1.0 - (1.0 - s ** rows) ** bands
+            error = ((1.0 - false_negative_weight) * p[below].sum()
+                     + false_negative_weight * (1.0 - p[~below]).sum()) * step
+            if best_error is None or error < best_error:
+                best, best_error = (bands, rows), error
+    return best
+
+
+def band_keys(signatures, bands, rows, owners=0):
+    """One uint64 key per LSH band of each signature, shape (len(signatures), bands)
+
+    owners is the user id of each signature, or one for all of them.
+    """
+    signatures = np.asarray(signatures, dtype=np.uint64).reshape(-1, signatures.shape[-1])
+    grouped = signatures[:, :bands * rows].reshape(len(signatures), bands, rows)
+    # The band number and owner are folded in, so equal rows in different
+    # bands, or of different users' documents, never collide
+    owners = np.asarray(owners, dtype=np.uint64).reshape(-1, 1)
+    keys = np.arange(bands, dtype=np.uint64) * np.uint64(_BAND_SALT) + owners * np.uint64(_OWNER_SALT)
+    for j in range(rows):
+        keys = keys * np.uint64(_FOLD) + grouped[:, :, j]
+    return keys ^ (keys >> np.uint64(31))
+
+
+class NearDuplicateIndex:
+    """Find documents a user analyzed whose text nearly matches their new upload
+
+    Every analyzed document's MinHash signature is stored in the
+    document_signatures table under its result cache digest and uploader.
+    The LSH band keys of all of them are kept in memory as one sorted
+    array, so a lookup is a binary search per band, then a comparison of
+    full signatures for the few documents found. Keys are salted with the
+    uploader, so one user's lookups never find another's documents. Rows
+    written by other processes are picked up on the next lookup.
+    """
+
+    def __init__(self, db, threshold=0.9, num_perm=NUM_PERM, shingle_words=SHINGLE_WORDS):
+        self.db = db
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        self.enabled = available() and threshold is not None
+        self.bands, self.rows = lsh_layout(threshold, num_perm) if self.enabled else (0, 0)
+        self.layout = f'{self.bands}x{self.rows}'
+        self._lock = threading.Lock()
+        self._keys = self._ids = None
+        self._pending = {}
+        self._pending_count = 0
+        self._last_id = 0
+        self.lookups = 0
+        self.matches = 0
+        self.reused = 0
+        self.lookup_seconds = 0.0
+
+    def signature(self, chunks):
+        """MinHash signature of a document's text, or None when lookup is off or it has no words"""
+        if not self.enabled:
+            return None
+        return minhash(chunks, self.num_perm, self.shingle_words)
+
+    def add(self, digest, user_id, signature):
+        """Record a document user_id analyzed; one already recorded for them is left as it is"""
+        if signature is None:
+            return
+        keys = band_keys(signature[None, :], self.bands, self.rows, user_id)[0]
+        with self.db.connection() as conn:
+            conn.execute('''INSERT OR IGNORE INTO document_signatures (digest, user_id, signature, layout, bands)
+                            VALUES (?, ?, ?, ?, ?)''',
+                         (digest, user_id, signature.astype('<u4').tobytes(), self.layout,
+                          keys.astype('<u8').tobytes()))
+
+    def find(self, signature, user_id):
+        """(similarity, digest) of user_id's documents at or above the threshold, most similar first"""
+        if signature is None:
+            return []
+        started = time.perf_counter()
+        keys = band_keys(signature[None, :], self.bands, self.rows, user_id)[0]
+        with self.db.connection() as conn:
+            with self._lock:
+                self._refresh(conn)
+                found = [self._ids[lo:hi] for lo, hi in zip(np.searchsorted(self._keys, keys, 'left'),
+                                                            np.searchsorted(self._keys, keys, 'right')) if hi > lo]
+                for key in keys.tolist():
+                    if key in self._pending:
+                        found.append(np.array(self._pending[key], dtype=np.int32))
+            matches = []
+            if found:
+                ids, shared = np.unique(np.concatenate(found), return_counts=True)
+                ids = ids[np.argsort(-shared, kind='stable')[:MAX_CANDIDATES]].tolist()
+                rows = conn.execute(f'''SELECT digest, signature FROM document_signatures
+                                        WHERE id IN ({','.join('?' * len(ids))}) AND user_id = ?''',
+                                    (*ids, user_id)).fetchall()
+                for digest, stored in rows:
+                    stored = np.frombuffer(stored, dtype='<u4')
+                    if len(stored) != len(signature):
+                        continue
+                    similarity = float(np.count_nonzero(stored == signature)) / len(signature)
+                    if similarity >= self.threshold:
+                        matches.append((similarity, digest))
+        matches.sort(reverse=True)
+        with self._lock:
+            self.lookups += 1
+            self.matches += bool(matches)
+            self.lookup_seconds += time.perf_counter() - started
+        return matches
+
+    def reuse(self, signature, user_id, lookup):
+        """The first result lookup(digest) returns for a similar document of user_id's, most similar first, or None"""
+        for _, digest in self.find(signature, user_id):
+            result = lookup(digest)
+            if result is not None:
+                with self._lock:
+                    self.reused += 1
+                return result
+        return None
+
+    def _refresh(self, conn):
+        if self._keys is None:
+            self._keys = np.empty(0, dtype=np.uint64)
+            self._ids = np.empty(0, dtype=np.int32)
+        rows = conn.execute('''SELECT id, layout = ?, CASE WHEN layout = ? THEN bands ELSE signature END, user_id
+                               FROM document_signatures WHERE id > ? ORDER BY id''',
+                            (self.layout, self.layout, self._last_id)).fetchall()
+        if not rows:
+            return
+        self._last_id = rows[-1][0]
+        ids = np.array([row[0] for row in rows], dtype=np.int32)
+        if all(row[1] for row in rows):
+            keys = np.frombuffer(b''.join(row[2] for row in rows), dtype='<u8').reshape(len(rows), self.bands)
+        else:
+            # Rows banded under another threshold are re-banded from their signatures
+            keys = np.empty((len(rows), self.bands), dtype=np.uint64)
+            for i, (_, current, data, user_id) in enumerate(rows):
+                if current:
+                    keys[i] = np.frombuffer(data, dtype='<u8')
+                else:
+                    stored = np.frombuffer(data, dtype='<u4')
+                    keys[i] = band_keys(stored[None, :], self.bands, self.rows, user_id)[0]
+        self._add_rows(ids, keys.astype(np.uint64))
+
+    def _add_rows(self, ids, keys):
+        flat_keys = keys.ravel()
+        flat_ids = np.repeat(ids, self.bands)
+        if self._pending_count + len(ids) < MERGE_EVERY:
+            for key, row_id in zip(flat_keys.tolist(), flat_ids.tolist()):
+                self._pending.setdefault(key, []).append(row_id)
+            self._pending_count += len(ids)
+            return
+        if self._pending:
+            pending = [(key, row_id) for key, row_ids in self._pending.items() for row_id in row_ids]
+            flat_keys = np.concatenate((flat_keys, np.array([key for key, _ in pending], dtype=np.uint64)))
+            flat_ids = np.concatenate((flat_ids, np.array([row_id for _, row_id in pending], dtype=np.int32)))
+            self._pending = {}
+            self._pending_count = 0
+        order = np.argsort(flat_keys)
+        flat_keys, flat_ids = flat_keys[order], flat_ids[order]
+        if len(self._keys):
+            positions = np.searchsorted(self._keys, flat_keys)
+            self._keys = np.insert(self._keys, positions, flat_keys)
+            self._ids = np.insert(self._ids, positions, flat_ids)
+        else:
+            self._keys, self._ids = flat_keys, flat_ids
+
+    def stats(self):
+        with self._lock:
+            indexed = (len(self._keys) // self.bands if self._keys is not None and self.bands else 0)
+            return {
+                'enabled': self.enabled,
+                'threshold': self.threshold,
+                'bands': self.bands,
+                'rows': self.rows,
+                'documents': indexed + self._pending_count,
+                'index_bytes': (self._keys.nbytes + self._ids.nbytes) if self._keys is not None else 0,
+                'lookups': self.lookups,
+                'matches': self.matches,
+                'reused': self.reused,
+                'mean_lookup_ms': round(self.lookup_seconds / self.lookups * 1000, 4) if self.lookups else 0.0
+            }
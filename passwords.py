@@ -0,0 +1,100 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full; retry later"""
+
+
+class PasswordHasher:
+    """Hash and check passwords on a small, bounded thread pool
+
+    hashlib releases the GIL while stretching keys, so max_workers threads
+    use at most that many cores (and, for scrypt, that many 32MB work
+    areas) however many users log in at once. Calls beyond max_workers
+    running plus max_queue waiting are refused at once with HasherBusy.
+    """
+
+    def __init__(self, method='scrypt', max_workers=2, max_queue=32):
+        self.method = method
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._method_prefix = None
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='password-hasher')
+            return self._executor
+
+    @property
+    def method_prefix(self):
+        """The method as written into hashes, e.g. 'scrypt' becomes 'scrypt:32768:8:1'"""
+        if self._method_prefix is None:
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return self._method_prefix
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise HasherBusy()
+            self._pending += 1
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self._done()
+            raise
+        future.add_done_callback(lambda f: self._done())
+        return future.result()
+
+    def _done(self):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method_prefix
+
+    def hash(self, password):
+        """Hash a new password with the configured method"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Check a password and return (matches, new_hash)
+
+        new_hash is set when the password matched but the stored hash was
+        made with other parameters; store it to upgrade the hash.
+        """
+        return self._run(self._verify, password_hash, password)
+
+    def _verify(self, password_hash, password):
+        if not check_password_hash(password_hash, password):
+            return False, None
+        if not self.needs_rehash(password_hash):
+            return True, None
+        with self._lock:
+            self.rehashed += 1
+        return True, generate_password_hash(password, self.method)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'method': self.method,
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'pending': self._pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'rehashed': self.rehashed
+            }
@@ -0,0 +1,98 @@
+import json
+import threading
+from collections import OrderedDict
+
+
+def make_cache_key(digest, summary_length, quiz_questions, engine='frequency'):
+    """Build a cache key from the text digest and the processing parameters"""
+    key = f'{digest}:{summary_length}:{quiz_questions}'
+    # Keys for the default engine keep their original form
+    if engine != 'frequency':
+        key += f':{engine}'
+    return key
+
+
+class ResultCache:
+    """Two-tier cache of /process results
+
+    The first tier is an in-process LRU bounded by the size of the encoded
+    results; the second is the result_cache table, so results survive
+    restarts and are shared between worker processes.
+    """
+
+    def __init__(self, db, max_bytes=64 * 1024 * 1024):
+        self.db = db
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached result for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+
+        with self.db.connection() as conn:
+            row = conn.execute('SELECT payload FROM result_cache WHERE cache_key = ?', (key,)).fetchone()
+
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        result = json.loads(row[0])
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, result, len(row[0]))
+        return result
+
+    def put(self, key, result):
+        """Store a result in both tiers"""
+        payload = json.dumps(result)
+        with self.db.connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO result_cache (cache_key, payload) VALUES (?, ?)',
+                         (key, payload))
+
+        with self._lock:
+            self._remember(key, result, len(payload))
+
+    def put_many(self, conn, items):
+        """Write (key, result) pairs to the disk tier only, on an open connection
+
+        Meant for bulk loads, which would otherwise flush the memory tier.
+        """
+        conn.executemany('INSERT OR REPLACE INTO result_cache (cache_key, payload) VALUES (?, ?)',
+                         ((key, json.dumps(result)) for key, result in items))
+
+    def _remember(self, key, result, size):
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (result, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def stats(self):
+        """Hit/miss counters and memory tier usage"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
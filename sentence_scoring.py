@@ -0,0 +1,121 @@
+# numpy and scipy are optional; only the default 'frequency' engine works without them
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
+
+ENGINES = ('frequency', 'vector', 'tfidf', 'textrank')
+VECTOR_ENGINES = ('vector', 'tfidf', 'textrank')
+
+
+def available():
+    """Whether the vectorized engines can run"""
+    return np is not None and sparse is not None
+
+
+def _term_arrays(doc):
+    # Term ids end to end and where each sentence's ids start
+    indices = np.frombuffer(doc.term_ids, dtype=np.int32)
+    lengths = np.frombuffer(doc.sentence_lengths, dtype=np.int32)
+    indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    return indices, indptr
+
+
+def term_matrix(doc):
+    """Sparse sentence x term count matrix, built once per document"""
+    matrix = getattr(doc, '_term_matrix', None)
+    if matrix is None:
+        indices, indptr = _term_arrays(doc)
+        # Term ids are process-wide; keep only the columns this document uses
+        terms, indices = np.unique(indices, return_inverse=True)
+        data = np.ones(len(indices), dtype=np.float64)
+        matrix = sparse.csr_matrix((data, indices.astype(np.int32), indptr),
+                                   shape=(len(indptr) - 1, len(terms)))
+        matrix.sum_duplicates()
+        doc._term_matrix = matrix
+    return matrix
+
+
+def _idf(matrix):
+    # Each (sentence, term) pair is stored once after sum_duplicates
+    df = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    n = matrix.shape[0]
+    return np.log((1 + n) / (1 + df)) + 1.0
+
+
+def frequency_scores(doc):
+    """Sum of document-wide word frequencies over each sentence's words
+
+    Needs no matrix: each word's frequency is summed straight over the
+    sentence ranges of the term ids.
+    """
+    indices, indptr = _term_arrays(doc)
+    totals = np.zeros(len(indices) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices)[indices], out=totals[1:])
+    return (totals[indptr[1:]] - totals[indptr[:-1]]).astype(np.float64)
+
+
+def tfidf_scores(doc):
+    """Like frequency_scores, with words that appear everywhere damped by IDF"""
+    matrix = term_matrix(doc)
+    freq = np.asarray(matrix.sum(axis=0)).ravel()
+    return matrix @ (freq * _idf(matrix))
+
+
+def textrank_scores(doc, damping=0.85, max_iter=50, tol=1e-6):
+    """PageRank over the cosine-similarity graph of TF-IDF sentence vectors
+
+    The similarity matrix S = X X^T is never materialized; every product
+    with it is computed as X (X^T v), which keeps each iteration O(nnz).
+    """
+    matrix = term_matrix(doc)
+    n = matrix.shape[0]
+    x = sparse.csr_matrix(matrix.multiply(_idf(matrix)))
+    norms = np.sqrt(np.asarray(x.multiply(x).sum(axis=1)).ravel())
+    inv = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    x = sparse.diags(inv) @ x
+    self_sim = (norms > 0).astype(np.float64)
+
+    def similarity_dot(v):
+        # S v without the diagonal (a sentence is not its own neighbour)
+        return x @ (x.T @ v) - self_sim * v
+
+    degree = similarity_dot(np.ones(n))
+    dangling = degree <= 1e-12
+    inv_degree = np.divide(1.0, degree, out=np.zeros_like(degree), where=~dangling)
+
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        spread = similarity_dot(rank * inv_degree) + rank[dangling].sum() / n
+        updated = (1 - damping) / n + damping * spread
+        if np.abs(updated - rank).sum() < tol:
+            rank = updated
+            break
+        rank = updated
+    return rank
+
+
+SCORERS = {
+    'vector': frequency_scores,
+    'tfidf': tfidf_scores,
+    'textrank': textrank_scores,
+}
+
+
+def top_sentences(doc, k, engine='vector'):
+    """Indices of the k best sentences, in document order
+
+    Sentences are scored by index, so duplicate sentences never collide.
+    """
+    if not available():
+        raise RuntimeError(f"The '{engine}' summary engine needs numpy and scipy")
+    scores = SCORERS[engine](doc)
+    k = min(k, len(scores))
+    if k <= 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top.sort()
+    return top.tolist()
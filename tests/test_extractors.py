@@ -0,0 +1,104 @@
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+
+import extractors
+
+
+def make_pdf(text):
+    """A one-page PDF showing text in Helvetica"""
+    content = f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'.encode('latin-1')
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R '
+        b'/Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+    xref = out.tell()
+    out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b'%010d 00000 n \n' % offset)
+    out.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def make_docx(paragraph, repeat):
+    """A DOCX whose document.xml repeats one paragraph, compressed"""
+    body = f'<w:p><w:r><w:t>{paragraph}</w:t></w:r></w:p>' * repeat
+    xml = ('<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+           f'<w:body>{body}</w:body></w:document>')
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('word/document.xml', xml)
+    out.seek(0)
+    return out
+
+
+class DocxLimitTest(unittest.TestCase):
+
+    def test_reads_within_limit(self):
+        text = ''.join(extractors.iter_document_text(make_docx('Short text.', 10), 'docx', max_chars=1000))
+        self.assertEqual(text.count('Short text.'), 10)
+
+    def test_expanded_text_past_limit_is_refused(self):
+        # 200,000 characters from a few KB; the XML alone is within DOCX_XML_BYTES_PER_CHAR
+        docx = make_docx('x' * 1000, 200)
+        self.assertLess(len(docx.getvalue()), 10 * 1024)
+        chunks = extractors.iter_document_text(docx, 'docx', chunk_size=1024, max_chars=100 * 1000)
+        with self.assertRaises(extractors.ExtractionError):
+            for _ in chunks:
+                pass
+
+    def test_oversized_document_xml_is_refused_before_parsing(self):
+        docx = make_docx('x' * 1000, 200)
+        with self.assertRaises(extractors.ExtractionError):
+            next(extractors.iter_document_text(docx, 'docx', max_chars=1000))
+
+
+@unittest.skipIf(extractors.pypdf is None, 'pypdf is not installed')
+class PdfExtractionTest(unittest.TestCase):
+
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.private = os.path.join(workdir.name, 'private.pdf')
+        with open(self.private, 'wb') as f:
+            f.write(make_pdf('Server side secret'))
+
+    def test_reads_trusted_path(self):
+        with open(self.private, 'rb') as f:
+            text = ''.join(extractors.iter_document_text(f, 'pdf', path=self.private))
+        self.assertIn('Server side secret', text)
+
+    def test_upload_stream_name_is_not_opened(self):
+        # A zip member named after a file on the server, holding something else
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as z:
+            z.writestr(self.private, make_pdf('Uploaded content'))
+        with zipfile.ZipFile(archive) as z, z.open(z.infolist()[0]) as member:
+            self.assertEqual(member.name, self.private)
+            text = ''.join(extractors.iter_document_text(member, extractors.document_type(member, member.name)))
+        self.assertIn('Uploaded content', text)
+        self.assertNotIn('secret', text)
+
+    def test_fake_pdf_named_after_server_file_is_rejected(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as z:
+            z.writestr(self.private, b'%PDF-not really')
+        with zipfile.ZipFile(archive) as z, z.open(z.infolist()[0]) as member:
+            with self.assertRaises(extractors.ExtractionError):
+                ''.join(extractors.iter_document_text(member, 'pdf'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+
+import app as study_app
+import database
+
+
+def make_result(pool_size=10):
+    """A processed result whose quiz pool answers question i with option 'a<i>'"""
+    pool = [{'id': i, 'question': f'Question {i}?', 'options': [f'a{i}', f'b{i}', f'c{i}', f'd{i}'],
+             'correct_answer': f'a{i}'} for i in range(pool_size)]
+    return {'summary': 'A summary.', 'keywords': ['summary'], 'original_length': 500, 'summary_length': 10,
+            'quiz': pool[:5], 'quiz_pool': pool}
+
+
+class QuizGradingTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # The database path is relative, and connections are only opened on first use
+        workdir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(workdir.cleanup)
+        cls.addClassCleanup(os.chdir, os.getcwd())
+        os.chdir(workdir.name)
+
+    def setUp(self):
+        self.client = study_app.app.test_client()
+        username = self.id().rsplit('.', 1)[-1]
+        self.client.post('/register', json={'username': username, 'email': f'{username}@example.com',
+                                            'password': 'Secret123!'})
+        self.client.post('/login', json={'username': username, 'password': 'Secret123!'})
+        with study_app.db.connection() as conn:
+            user_id = database.find_user(conn, username)['id']
+            self.summary_id = study_app.insert_summary(conn, user_id, 'Notes', make_result())
+
+    def sample(self, seed=1, questions=5):
+        response = self.client.get(f'/summaries/{self.summary_id}/quiz?seed={seed}&questions={questions}')
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def submit(self, quiz_token, answers, summary_id=None):
+        return self.client.post('/save-quiz-result', json={
+            'summary_id': self.summary_id if summary_id is None else summary_id,
+            'quiz_token': quiz_token, 'answers': answers})
+
+    def test_grades_issued_quiz(self):
+        quiz = self.sample()
+        answers = {str(q['id']): f"a{q['id']}" for q in quiz['quiz']}
+        response = self.submit(quiz['quiz_token'], answers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['score'], 5)
+
+    def test_token_is_required(self):
+        quiz = self.sample()
+        answers = {str(q['id']): 'x' for q in quiz['quiz']}
+        self.assertEqual(self.submit(None, answers).status_code, 400)
+        self.assertEqual(self.submit(quiz['quiz_token'] + 'x', answers).status_code, 400)
+
+    def test_token_of_another_summary_is_rejected(self):
+        quiz = self.sample()
+        answers = {str(q['id']): 'x' for q in quiz['quiz']}
+        self.assertEqual(self.submit(quiz['quiz_token'], answers, summary_id=self.summary_id + 1).status_code, 400)
+
+    def test_answers_must_match_issued_questions(self):
+        quiz = self.sample()
+        ids = [q['id'] for q in quiz['quiz']]
+        subset = {str(ids[0]): f'a{ids[0]}'}
+        self.assertEqual(self.submit(quiz['quiz_token'], subset).status_code, 400)
+        others = {str(i): f'a{i}' for i in range(10) if i not in ids}
+        self.assertEqual(self.submit(quiz['quiz_token'], others).status_code, 400)
+
+    def test_replayed_token_is_rejected(self):
+        quiz = self.sample()
+        wrong = {str(q['id']): 'wrong' for q in quiz['quiz']}
+        first = self.submit(quiz['quiz_token'], wrong)
+        self.assertEqual(first.get_json()['score'], 0)
+        revealed = {str(k): v for k, v in first.get_json()['correct_answers'].items()}
+        self.assertEqual(self.submit(quiz['quiz_token'], revealed).status_code, 409)
+        # Asking for the same seed again gives the same quiz, which is not graded twice
+        again = self.sample()
+        self.assertEqual(self.submit(again['quiz_token'], revealed).status_code, 409)
+        stats = self.client.get('/my-stats').get_json()
+        self.assertEqual(stats['quizzes'], 1)
+        self.assertEqual(stats['best_percentage'], 0)
+
+    def test_new_seed_is_graded(self):
+        for seed in (1, 2):
+            quiz = self.sample(seed)
+            response = self.submit(quiz['quiz_token'], {str(q['id']): 'wrong' for q in quiz['quiz']})
+            self.assertEqual(response.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
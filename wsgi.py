@@ -0,0 +1,9 @@
+import gc
+
+from app import create_app
+
+# gunicorn --preload wsgi:app runs this once in the master, before forking
+app = create_app()
+
+# Keep start-up objects out of the cyclic GC so forked workers never write to their pages
+gc.freeze()